@@ -0,0 +1,42 @@
+import os
+import sys
+import time
+import statistics
+import subprocess
+import tempfile
+import argparse
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Each scenario is run in a fresh interpreter so import caches do not carry over
+SCENARIOS = {
+    "import main": "import main",
+    "config + tracker": "import main; main.ConfigManager(); main.ChosenContentTracker(update_last_video_type=False)",
+    "full generator": "import main; main.ShortsGenerator(update_last_video_type=False)",
+    "eager heavy imports": "import main, moviepy, numpy, openai, edge_tts, googleapiclient.discovery, google_auth_oauthlib.flow",
+}
+
+def time_scenario(code, runs, work_dir):
+    """Return the wall-clock durations of running code in a new interpreter"""
+    env = dict(os.environ, PYTHONPATH=REPO_DIR, OPENAI_API_KEY=os.getenv("OPENAI_API_KEY", "benchmark"))
+    durations = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, "-c", code], cwd=work_dir, env=env, check=True)
+        durations.append(time.perf_counter() - start)
+    return durations
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure ShortsGenerator startup time")
+    parser.add_argument("--runs", type=int, default=5, help="runs per scenario (default: 5)")
+    args = parser.parse_args()
+    
+    # Run from a scratch directory since ConfigManager creates config.json and folders
+    with tempfile.TemporaryDirectory() as work_dir:
+        print(f"{'scenario':<22} {'median':>9} {'min':>9} {'max':>9}")
+        for name, code in SCENARIOS.items():
+            durations = time_scenario(code, args.runs, work_dir)
+            print(f"{name:<22} {statistics.median(durations):>8.3f}s {min(durations):>8.3f}s {max(durations):>8.3f}s")
+
+if __name__ == "__main__":
+    main()
@@ -1,19 +1,33 @@
 import os
 import json
 import requests
-import edge_tts
 import random
 import asyncio
 import pickle
+import shutil
+import copy
+import argparse
+import subprocess
+import threading
+import time
+import heapq
+import itertools
+import bisect
+import re
+import socket
+import platform
+import contextlib
+import collections
+import cProfile
+import pstats
+import sys
+import sqlite3
 
-from openai import OpenAI
 from dotenv import load_dotenv
-from datetime import timedelta
-from moviepy import VideoFileClip, TextClip, CompositeVideoClip, AudioFileClip, concatenate_videoclips
-from googleapiclient.discovery import build
-from googleapiclient.http import MediaFileUpload
-from google_auth_oauthlib.flow import InstalledAppFlow
-from google.auth.transport.requests import Request
+from datetime import timedelta, datetime
+
+# Heavy dependencies (moviepy, numpy, openai, edge_tts and the Google API clients) are
+# imported inside the stage that uses them, so config and tracker tooling starts quickly.
 
 class ConfigManager:
     def __init__(self):
@@ -24,10 +38,14 @@ class ConfigManager:
         self.background_dir = self.config["paths"]["background_dir"]
         self.temp_dir = self.config["paths"]["temp_dir"]
         self.output_dir = self.config["paths"]["output_dir"]
+        self.cache_dir = self.config["paths"].get("cache_dir", "./cache")
+        # Set on job configs created by WorkspaceManager, None means unlimited
+        self.quota_bytes = None
         
         # Ensure directories exist
         os.makedirs(self.temp_dir, exist_ok=True)
         os.makedirs(self.output_dir, exist_ok=True)
+        os.makedirs(self.cache_dir, exist_ok=True)
         os.makedirs("./chosen", exist_ok=True)
         
         # API settings
@@ -38,6 +56,20 @@ class ConfigManager:
         self.pexels_api_key = os.getenv("PEXELS_API_KEY")
         self.google_api_key = os.getenv("GOOGLE_API_KEY")
 
+    def with_temp_dir(self, temp_dir):
+        """Return a copy of this config that writes intermediate files to temp_dir"""
+        job_config = copy.copy(self)
+        job_config.temp_dir = temp_dir
+        os.makedirs(temp_dir, exist_ok=True)
+        return job_config
+
+    def for_job(self, job_id, temp_dir=None):
+        """Return a copy of this config with temp and output directories of its own for job_id"""
+        job_config = self.with_temp_dir(temp_dir or os.path.join(self.temp_dir, job_id))
+        job_config.output_dir = os.path.join(self.output_dir, job_id)
+        os.makedirs(job_config.output_dir, exist_ok=True)
+        return job_config
+
     def load_config(self):
         try:
             with open('config.json', 'r') as f:
@@ -54,12 +86,93 @@ class ConfigManager:
                     "short_format": {"width": 1080, "height": 1920},
                     "long_format": {"width": 1920, "height": 1080},
                     "font": "./fonts/Lobster-Regular.ttf",
-                    "font_size": 70
+                    "font_size": 70,
+                    "fps": 30
+                },
+                "audio": {
+                    "sample_rate": 44100,
+                    "target_loudness": -16.0,
+                    "peak_limit": -1.0
+                },
+                "pexels": {
+                    "requests_per_hour": 200,
+                    "burst": 10,
+                    "prefetch_reserve": 3
                 },
                 "paths": {
                     "background_dir": "./background",
                     "temp_dir": "./temp",
-                    "output_dir": "./output"
+                    "output_dir": "./output",
+                    "cache_dir": "./cache"
+                },
+                "prefetch": {
+                    "normalize_clips": True
+                },
+                "multi_format": {
+                    "formats": ["short", "long"]
+                },
+                "variants": [],
+                "profiling": {
+                    "enabled": False,
+                    "output_dir": "./profiles",
+                    "sample_interval": 0.005
+                },
+                "workspace": {
+                    "use_tmpfs": True,
+                    "tmpfs_dir": "/dev/shm/shortsgenerator",
+                    "quota_mb": 4096
+                },
+                "concurrency": {
+                    "max_downloads": 4,
+                    "max_tts": 4,
+                    "max_renders": 2,
+                    "max_rss_mb": None,
+                    "min_available_mb": 512,
+                    "sample_interval": 1.0
+                },
+                "autotune": {
+                    "seconds": 2,
+                    "presets": ["ultrafast", "superfast", "veryfast", "faster", "fast", "medium"],
+                    "crf": [18, 20, 23, 26],
+                    "final_ssim_drop": 0.01,
+                    "final_min_speed": 1.0,
+                    "intermediate_ssim_drop": 0.003
+                },
+                "clip_index": {
+                    "enabled": True,
+                    "library_dir": "./cache/clips",
+                    "keep_downloads": True,
+                    "max_library_mb": 10240,
+                    "synonyms": {
+                        "ocean": ["sea"],
+                        "car": ["automobile", "vehicle"],
+                        "city": ["urban", "town"],
+                        "forest": ["woods", "jungle"],
+                        "people": ["person", "crowd"],
+                        "space": ["galaxy", "universe", "cosmos"],
+                        "computer": ["laptop"],
+                        "money": ["cash", "currency"]
+                    }
+                },
+                "scheduler": {
+                    "jobs_file": "./schedule.json",
+                    "max_parallel": 2,
+                    "parallel_slowdown": 0.6
+                },
+                "distributed": {
+                    "enabled": False,
+                    "backend": "sqlite",
+                    "sqlite_path": "./cache/tasks.db",
+                    "redis_url": "redis://localhost:6379/0",
+                    "shared_dir": "./shared",
+                    "lease_seconds": 300,
+                    "max_attempts": 3,
+                    "poll_interval": 2
+                },
+                "draft": {
+                    "scale": 0.33,
+                    "fps_scale": 0.5,
+                    "crf": 35
                 },
                 "youtube": {
                     "default_tags": ["Shorts", "QuickClips", "FunFacts"],
@@ -71,8 +184,114 @@ class ConfigManager:
                 json.dump(default_config, f, indent=2)
             return default_config
 
+class WorkspaceManager:
+    """Gives each job a private directory for its intermediate files.
+    
+    Workspaces go on a RAM-backed tmpfs when one has room for the quota and fall back to
+    temp_dir otherwise. Each workspace records the process that owns it, so directories
+    left behind by killed processes can be removed at startup.
+    """
+    
+    OWNER_FILE = ".owner.json"
+    
+    def __init__(self, config_manager):
+        self.config = config_manager
+        settings = self.config.config.get("workspace", {})
+        self.use_tmpfs = settings.get("use_tmpfs", True)
+        self.tmpfs_dir = settings.get("tmpfs_dir", "/dev/shm/shortsgenerator")
+        self.disk_dir = os.path.join(self.config.temp_dir, "jobs")
+        self.quota_bytes = int(settings.get("quota_mb", 4096) * 1024 * 1024)
+        self.hostname = socket.gethostname()
+    
+    def select_root(self):
+        """Return the tmpfs root when it can hold a full quota, otherwise the disk root"""
+        if self.use_tmpfs:
+            parent = os.path.dirname(os.path.abspath(self.tmpfs_dir))
+            try:
+                if os.path.isdir(parent) and shutil.disk_usage(parent).free >= self.quota_bytes:
+                    return self.tmpfs_dir
+            except OSError:
+                pass
+        return self.disk_dir
+    
+    def process_start_time(self, pid):
+        """Return the start time of pid from /proc, which tells a reused pid apart"""
+        try:
+            with open(f"/proc/{pid}/stat") as f:
+                # The command name may contain spaces, the fields after it are fixed
+                return int(f.read().rsplit(")", 1)[1].split()[19])
+        except (OSError, IndexError, ValueError):
+            return None
+    
+    def is_alive(self, owner):
+        try:
+            os.kill(owner["pid"], 0)
+        except ProcessLookupError:
+            return False
+        except PermissionError:
+            pass
+        start_time = owner.get("start_time")
+        return start_time is None or self.process_start_time(owner["pid"]) in (None, start_time)
+    
+    def create(self, job_id):
+        """Create the workspace for job_id and return its path"""
+        path = os.path.join(self.select_root(), job_id)
+        os.makedirs(path, exist_ok=True)
+        self.write_owner(path)
+        return path
+    
+    def write_owner(self, path):
+        """Record this process as the owner of the directory at path"""
+        pid = os.getpid()
+        with open(os.path.join(path, self.OWNER_FILE), 'w') as f:
+            json.dump({
+                "pid": pid,
+                "host": self.hostname,
+                "start_time": self.process_start_time(pid),
+                "created": datetime.now().isoformat()
+            }, f)
+    
+    def abandoned_owner(self, path):
+        """Return the owner of path when it is a process on this host that is gone, else None"""
+        try:
+            with open(os.path.join(path, self.OWNER_FILE)) as f:
+                owner = json.load(f)
+        except (OSError, json.JSONDecodeError):
+            return None
+        if owner.get("host") != self.hostname or self.is_alive(owner):
+            return None
+        return owner
+    
+    @contextlib.contextmanager
+    def workspace(self, job_id):
+        """Yield a config whose temp_dir is a fresh workspace for job_id, removed afterwards"""
+        path = self.create(job_id)
+        job_config = self.config.with_temp_dir(path)
+        job_config.quota_bytes = self.quota_bytes
+        try:
+            yield job_config
+        finally:
+            shutil.rmtree(path, ignore_errors=True)
+    
+    def collect_garbage(self):
+        """Remove workspaces whose owning process on this host is no longer running"""
+        removed = 0
+        for root in {self.tmpfs_dir, self.disk_dir}:
+            if not os.path.isdir(root):
+                continue
+            for name in os.listdir(root):
+                path = os.path.join(root, name)
+                owner = self.abandoned_owner(path)
+                if not owner:
+                    continue
+                shutil.rmtree(path, ignore_errors=True)
+                removed += 1
+                print(f"Removed workspace {path} left by process {owner.get('pid')}")
+        return removed
+
+
 class ChosenContentTracker:
-    def __init__(self):
+    def __init__(self, update_last_video_type=True):
         self.chosen_facts = self._load_chosen_content("./chosen/chosen_facts.json")
         self.chosen_stories = self._load_chosen_content("./chosen/chosen_stories.json")
         self.chosen_topics = self._load_chosen_content("./chosen/chosen_topics.json")
@@ -80,8 +299,9 @@ class ChosenContentTracker:
         self.use_story_prompt = self.last_video_type != 'story'
         
         # Update last video type
-        with open('last_video_type.txt', 'w') as file:
-            file.write('story' if self.use_story_prompt else 'fact')
+        if update_last_video_type:
+            with open('last_video_type.txt', 'w') as file:
+                file.write('story' if self.use_story_prompt else 'fact')
 
     def _load_chosen_content(self, file_path):
         if not os.path.exists(file_path) or os.stat(file_path).st_size == 0:
@@ -142,10 +362,18 @@ class TextGenerator:
     def __init__(self, config_manager, content_tracker):
         self.config = config_manager
         self.content_tracker = content_tracker
-        self.client = OpenAI(
-            api_key=self.config.openai_api_key,
-            base_url=self.config.openai_endpoint,
-        )
+        self._client = None
+
+    @property
+    def client(self):
+        """OpenAI client, created on first use"""
+        if self._client is None:
+            from openai import OpenAI
+            self._client = OpenAI(
+                api_key=self.config.openai_api_key,
+                base_url=self.config.openai_endpoint,
+            )
+        return self._client
 
     def generate_text(self, prompt, model=None, max_tokens=500):
         model = model or self.config.openai_model
@@ -163,6 +391,49 @@ class TextGenerator:
             print(f"Error: {e}")
             return None
 
+    def generate_text_stream(self, prompt, model=None, max_tokens=500, on_chunk=None):
+        """Stream a completion, passing every text delta to on_chunk, and return the full text"""
+        model = model or self.config.openai_model
+        try:
+            stream = self.client.chat.completions.create(
+                model=model,
+                messages=[
+                    {"role": "system", "content": "You are a content creating assistant and will follow the users requests exactly."},
+                    {"role": "user", "content": prompt},
+                ],
+                max_tokens=max_tokens,
+                stream=True,
+            )
+            chunks = []
+            for event in stream:
+                if not event.choices:
+                    continue
+                delta = event.choices[0].delta.content
+                if delta:
+                    chunks.append(delta)
+                    if on_chunk:
+                        on_chunk(delta)
+            return "".join(chunks).strip()
+        except Exception as e:
+            print(f"Error: {e}")
+            return None
+
+    def translate_script(self, script_data, language):
+        """Translate the text fields of a script to language, returns the parsed script or None"""
+        prompt = f"""
+Translate every text value of the following JSON object to {language}. Keep the keys, the structure and the "keyword" values unchanged. Return only the JSON object without markdown:
+
+{json.dumps(script_data, indent=2)}
+"""
+        translated = self.generate_text(prompt, max_tokens=4096)
+        if not translated:
+            return None
+        try:
+            return json.loads(translated)
+        except json.JSONDecodeError as e:
+            print(f"JSON decode error: {e}")
+            return None
+
     def get_short_video_prompt(self):
         return f"""
 Generate a JSON object for a short-form video script. The script should include a fact, a hook to grab attention, and an engagement question to encourage viewer interaction. The script should be split into three or more parts to ensure frequent background video switches. Each part should include a portion of the script and one relevant stock video keyword. Avoid using any facts from the provided array of already chosen facts. Ensure the script does not always start with "Did you know that". Also, generate a description for the video. Format the response as follows without markdown:
@@ -292,6 +563,65 @@ Already choses topics:
             # Save to chosen topics
             self.content_tracker.save_new_content('topic', topic)
 
+class StreamingScriptParser:
+    """Incrementally scan a streamed JSON completion and emit each "script" part once it is complete"""
+    
+    def __init__(self):
+        self.buffer = ""
+        self.position = 0
+        self.depth = 0
+        self.in_string = False
+        self.escape = False
+        self.string_start = None
+        self.last_key = None
+        self.array_depth = None
+        self.part_start = None
+        self.done = False
+    
+    def feed(self, chunk):
+        """Add streamed text and return the script parts completed by it"""
+        self.buffer += chunk
+        parts = []
+        
+        while self.position < len(self.buffer) and not self.done:
+            char = self.buffer[self.position]
+            
+            if self.in_string:
+                if self.escape:
+                    self.escape = False
+                elif char == "\\":
+                    self.escape = True
+                elif char == '"':
+                    self.in_string = False
+                    # Remember keys of the top-level object to find the script array
+                    if self.depth == 1:
+                        self.last_key = self.buffer[self.string_start + 1:self.position]
+            elif char == '"':
+                self.in_string = True
+                self.string_start = self.position
+            elif char in "{[":
+                if char == "[" and self.depth == 1 and self.last_key == "script":
+                    self.array_depth = self.depth + 1
+                elif char == "{" and self.array_depth is not None and self.depth == self.array_depth:
+                    self.part_start = self.position
+                self.depth += 1
+            elif char in "}]":
+                self.depth -= 1
+                if self.array_depth is not None:
+                    if char == "}" and self.depth == self.array_depth and self.part_start is not None:
+                        try:
+                            parts.append(json.loads(self.buffer[self.part_start:self.position + 1]))
+                        except json.JSONDecodeError as e:
+                            print(f"JSON decode error in streamed part: {e}")
+                        self.part_start = None
+                    elif char == "]" and self.depth == self.array_depth - 1:
+                        self.done = True
+            
+            self.position += 1
+        
+        return parts
+
+
 class FileUtils:
     def __init__(self, config_manager):
         self.config = config_manager
@@ -317,6 +647,45 @@ class FileUtils:
             print(f"Error: {e}")
             return None
     
+    def ffmpeg_binary(self):
+        """Return the ffmpeg executable moviepy is configured to use"""
+        from moviepy.config import FFMPEG_BINARY
+        return FFMPEG_BINARY
+    
+    def temp_dir_usage(self):
+        total = 0
+        for root, _, files in os.walk(self.config.temp_dir):
+            for name in files:
+                try:
+                    total += os.path.getsize(os.path.join(root, name))
+                except OSError:
+                    pass
+        return total
+    
+    def check_quota(self, pending_bytes=0):
+        """Raise when the job's temp_dir plus pending_bytes would exceed its workspace quota.
+        
+        Returns the current usage of temp_dir, or 0 when the job has no quota.
+        """
+        if self.config.quota_bytes is None:
+            return 0
+        usage = self.temp_dir_usage()
+        if usage + pending_bytes > self.config.quota_bytes:
+            raise RuntimeError(
+                f"Workspace {self.config.temp_dir} exceeds its quota: "
+                f"{(usage + pending_bytes) / 1024 / 1024:.0f} MB of {self.config.quota_bytes / 1024 / 1024:.0f} MB"
+            )
+        return usage
+    
+    def link_or_copy(self, source, destination):
+        """Hard link source to destination, copying when they are on different filesystems"""
+        if os.path.exists(destination):
+            os.remove(destination)
+        try:
+            os.link(source, destination)
+        except OSError:
+            shutil.copyfile(source, destination)
+    
     def delete_temp_files(self, file_names=None):
         if not file_names:
             return
@@ -331,27 +700,447 @@ class FileUtils:
                     print(f"Error deleting file {name}: {e}")
 
 
+class PexelsRateLimiter:
+    """Token bucket shared by every Pexels API request in the process.
+    
+    Waiting requests are granted in priority order, lower values first, so searches for the
+    part about to render overtake prefetch work. The X-Ratelimit-* response headers cap the
+    tokens, and the rest of the monthly quota is only spread out once it runs low.
+    """
+    
+    # Priorities at or above this value are deferred while the bucket runs low
+    PRIORITY_PREFETCH = 1000
+    
+    def __init__(self, requests_per_hour=200, burst=10, prefetch_reserve=3):
+        self.max_rate = requests_per_hour / 3600
+        self.refill_rate = self.max_rate
+        self.capacity = burst
+        self.tokens = float(burst)
+        self.prefetch_reserve = prefetch_reserve
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+        self.condition = threading.Condition()
+        self.waiting = []
+        self.sequence = itertools.count()
+    
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.refill_rate)
+        self.updated = now
+    
+    def acquire(self, priority=0):
+        """Block until a request with the given priority may be sent"""
+        ticket = (priority, next(self.sequence))
+        with self.condition:
+            heapq.heappush(self.waiting, ticket)
+            try:
+                while True:
+                    self._refill()
+                    now = time.monotonic()
+                    # The bucket never holds more than capacity, so the reserve cannot exceed it
+                    required = min(1 + (self.prefetch_reserve if priority >= self.PRIORITY_PREFETCH else 0), self.capacity)
+                    if self.waiting[0] == ticket and now >= self.blocked_until and self.tokens >= required:
+                        self.tokens -= 1
+                        return
+                    
+                    # Sleep until the bucket could have refilled, other waiters wake us earlier
+                    wait = max(self.blocked_until - now, (required - self.tokens) / self.refill_rate, 0.05)
+                    self.condition.wait(min(wait, 60))
+            finally:
+                self.waiting.remove(ticket)
+                heapq.heapify(self.waiting)
+                self.condition.notify_all()
+    
+    def update(self, response):
+        """Adapt the bucket to the rate limit headers and status of a Pexels response"""
+        with self.condition:
+            remaining = response.headers.get("X-Ratelimit-Remaining")
+            reset = response.headers.get("X-Ratelimit-Reset")
+            seconds_to_reset = None
+            if reset is not None:
+                try:
+                    seconds_to_reset = max(float(reset) - time.time(), 1.0)
+                except ValueError:
+                    pass
+            
+            if remaining is not None:
+                try:
+                    remaining = int(remaining)
+                except ValueError:
+                    remaining = None
+            
+            if remaining is not None:
+                self._refill()
+                self.tokens = min(self.tokens, remaining)
+                # X-Ratelimit-Reset is the rollover of the monthly quota, so the configured rate
+                # stays in force until less than an hour of requests is left in the quota
+                if seconds_to_reset and remaining < self.max_rate * 3600:
+                    self.refill_rate = max(min(self.max_rate, remaining / seconds_to_reset), 1 / seconds_to_reset)
+                else:
+                    self.refill_rate = self.max_rate
+                if remaining == 0 and seconds_to_reset:
+                    self.blocked_until = time.monotonic() + seconds_to_reset
+            
+            if response.status_code == 429:
+                retry_after = response.headers.get("Retry-After")
+                try:
+                    delay = float(retry_after) if retry_after else (seconds_to_reset or 60)
+                except ValueError:
+                    delay = seconds_to_reset or 60
+                self.tokens = 0.0
+                self.blocked_until = max(self.blocked_until, time.monotonic() + delay)
+            
+            self.condition.notify_all()
+
+
+class ClipIndex:
+    """Inverted index from normalized keywords to video clips already on disk.
+    
+    Covers the background directory, indexed by filename, and a library of previously
+    downloaded Pexels clips, indexed by the search keyword, URL slug, tags and creator
+    captured at download time. Terms are stemmed and expanded with configured synonyms
+    at query time.
+    """
+    
+    VIDEO_EXTENSIONS = (".mp4", ".mov", ".m4v", ".mkv", ".webm")
+    # Bump when stem or terms change, stored terms are then derived again from the clip text
+    TERMS_VERSION = 2
+    STOPWORDS = {"a", "an", "and", "at", "by", "for", "from", "in", "of", "on", "or", "the", "to", "with", "video", "footage", "stock"}
+    
+    def __init__(self, config_manager):
+        self.config = config_manager
+        settings = self.config.config.get("clip_index", {})
+        self.library_dir = settings.get("library_dir", os.path.join(self.config.cache_dir, "clips"))
+        self.keep_downloads = settings.get("keep_downloads", True)
+        self.max_library_bytes = int(settings.get("max_library_mb", 10240) * 1024 * 1024)
+        self.path = os.path.join(self.config.cache_dir, "clip_index.db")
+        self.lock = threading.Lock()
+        self.refreshed = False
+        
+        # Every word of a synonym group expands to the stems of the whole group
+        self.synonyms = {}
+        for word, alternatives in settings.get("synonyms", {}).items():
+            group = {self.stem(term) for term in [word] + alternatives}
+            for term in group:
+                self.synonyms.setdefault(term, set()).update(group)
+        
+        os.makedirs(self.library_dir, exist_ok=True)
+        conn = self._connect()
+        try:
+            conn.execute("PRAGMA journal_mode=WAL")
+            version = conn.execute("PRAGMA user_version").fetchone()[0]
+            if version < 2:
+                # Indexes before version 2 did not keep the clip text, so they are rebuilt from scratch
+                conn.execute("DROP TABLE IF EXISTS terms")
+                conn.execute("DROP TABLE IF EXISTS clips")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS clips (
+                    path TEXT PRIMARY KEY,
+                    source TEXT NOT NULL,
+                    text TEXT NOT NULL DEFAULT '',
+                    pexels_id TEXT,
+                    duration REAL NOT NULL,
+                    width INTEGER NOT NULL,
+                    height INTEGER NOT NULL,
+                    mtime REAL NOT NULL,
+                    added REAL NOT NULL
+                )
+            """)
+            conn.execute("CREATE TABLE IF NOT EXISTS terms (term TEXT NOT NULL, path TEXT NOT NULL, PRIMARY KEY (term, path))")
+            conn.execute("CREATE INDEX IF NOT EXISTS clips_pexels_id ON clips (pexels_id)")
+            if version != self.TERMS_VERSION:
+                self.reindex_terms(conn)
+                conn.execute(f"PRAGMA user_version = {self.TERMS_VERSION}")
+        finally:
+            conn.close()
+    
+    def reindex_terms(self, conn):
+        """Derive the terms of every clip again from its stored text"""
+        rows = conn.execute("SELECT path, text FROM clips").fetchall()
+        conn.execute("BEGIN IMMEDIATE")
+        conn.execute("DELETE FROM terms")
+        conn.executemany(
+            "INSERT OR IGNORE INTO terms (term, path) VALUES (?, ?)",
+            [(term, row["path"]) for row in rows for term in set(self.terms(row["text"]))]
+        )
+        conn.execute("COMMIT")
+    
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        return conn
+    
+    @staticmethod
+    def stem(word):
+        """Strip common English suffixes so 'waves', 'waving' and 'wave' share a term.
+        
+        A trailing 'e' is dropped from every stem, so 'horse', 'horses' and 'smiling' reduce
+        the same way as 'hors' and 'smil'.
+        """
+        if len(word) > 4 and word.endswith("ies"):
+            return word[:-3] + "y"
+        if word.endswith("sses"):
+            return word[:-2]
+        for suffix in ("ing", "ed"):
+            if len(word) > len(suffix) + 2 and word.endswith(suffix):
+                word = word[:-len(suffix)]
+                # running -> runn -> run
+                if len(word) > 2 and word[-1] == word[-2] and word[-1] not in "lsz":
+                    word = word[:-1]
+                break
+        else:
+            if len(word) > 4 and word.endswith("es") and word[-3] in "sxz":
+                word = word[:-2]
+            elif len(word) > 3 and word.endswith("s") and not word.endswith("ss"):
+                word = word[:-1]
+        if len(word) > 3 and word.endswith("e"):
+            word = word[:-1]
+        return word
+    
+    def terms(self, text):
+        """Return the stemmed terms of free text, a filename or a URL slug"""
+        # Split camelCase filenames before lowercasing
+        text = re.sub(r"([a-z])([A-Z])", r"\1 \2", text or "")
+        words = re.findall(r"[a-z]+", text.lower())
+        return [self.stem(word) for word in words if len(word) > 1 and word not in self.STOPWORDS]
+    
+    def add_clip(self, path, source, text, duration, width, height, pexels_id=None):
+        path = os.path.abspath(path)
+        terms = set(self.terms(text))
+        with self.lock:
+            conn = self._connect()
+            try:
+                conn.execute("BEGIN IMMEDIATE")
+                conn.execute(
+                    "INSERT OR REPLACE INTO clips (path, source, text, pexels_id, duration, width, height, mtime, added) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    (path, source, text, pexels_id, duration, width, height, os.path.getmtime(path), time.time())
+                )
+                conn.execute("DELETE FROM terms WHERE path = ?", (path,))
+                conn.executemany("INSERT OR IGNORE INTO terms (term, path) VALUES (?, ?)", [(term, path) for term in terms])
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+            finally:
+                conn.close()
+    
+    def remove_clip(self, path):
+        with self.lock:
+            conn = self._connect()
+            try:
+                conn.execute("DELETE FROM terms WHERE path = ?", (path,))
+                conn.execute("DELETE FROM clips WHERE path = ?", (path,))
+            finally:
+                conn.close()
+    
+    def probe(self, path):
+        """Return duration, width and height of a video file"""
+        from moviepy.video.io.ffmpeg_reader import ffmpeg_parse_infos
+        
+        infos = ffmpeg_parse_infos(path)
+        width, height = infos["video_size"]
+        return infos["duration"], width, height
+    
+    def refresh(self):
+        """Index new or changed files in the background and library directories, drop deleted ones"""
+        conn = self._connect()
+        try:
+            indexed = {row["path"]: row["mtime"] for row in conn.execute("SELECT path, mtime FROM clips")}
+        finally:
+            conn.close()
+        
+        seen = set()
+        for directory, source in ((self.config.background_dir, "background"), (self.library_dir, "library")):
+            if not os.path.isdir(directory):
+                continue
+            for name in os.listdir(directory):
+                if not name.lower().endswith(self.VIDEO_EXTENSIONS):
+                    continue
+                path = os.path.abspath(os.path.join(directory, name))
+                seen.add(path)
+                if indexed.get(path) == os.path.getmtime(path):
+                    continue
+                try:
+                    duration, width, height = self.probe(path)
+                except Exception as e:
+                    print(f"Error indexing clip {path}: {e}")
+                    continue
+                self.add_clip(path, source, os.path.splitext(name)[0], duration, width, height)
+        
+        for path in set(indexed) - seen:
+            self.remove_clip(path)
+    
+    def orientation_matches(self, clip, orientation):
+        if clip["width"] == clip["height"]:
+            return True
+        return (clip["height"] > clip["width"]) == (orientation == "portrait")
+    
+    def search(self, keyword, orientation, exclude=()):
+        """Return clips matching every term of keyword in the given orientation, best fit first"""
+        terms = self.terms(keyword)
+        if not terms:
+            return []
+        
+        # Directories are scanned on first use, probing clips needs moviepy
+        with self.lock:
+            refresh = not self.refreshed
+            self.refreshed = True
+        if refresh:
+            self.refresh()
+        
+        conn = self._connect()
+        try:
+            paths = None
+            for term in terms:
+                alternatives = sorted(self.synonyms.get(term, {term}))
+                rows = conn.execute(
+                    f"SELECT path FROM terms WHERE term IN ({','.join('?' * len(alternatives))})",
+                    alternatives
+                ).fetchall()
+                matches = {row["path"] for row in rows}
+                paths = matches if paths is None else paths & matches
+                if not paths:
+                    return []
+            clips = [dict(row) for row in conn.execute(
+                f"SELECT * FROM clips WHERE path IN ({','.join('?' * len(paths))})",
+                sorted(paths)
+            )]
+        finally:
+            conn.close()
+        
+        clips = [clip for clip in clips if clip["path"] not in exclude and os.path.exists(clip["path"]) and self.orientation_matches(clip, orientation)]
+        # Vary the footage between videos that share a keyword
+        random.shuffle(clips)
+        return clips
+    
+    def find_pexels_clip(self, pexels_id):
+        conn = self._connect()
+        try:
+            row = conn.execute("SELECT path FROM clips WHERE pexels_id = ?", (str(pexels_id),)).fetchone()
+        finally:
+            conn.close()
+        return row["path"] if row and os.path.exists(row["path"]) else None
+    
+    def add_download(self, file_path, video, video_file, keyword):
+        """Keep a downloaded Pexels clip in the library, indexed by its search metadata"""
+        if not self.keep_downloads or self.find_pexels_clip(video["id"]):
+            return
+        library_path = os.path.join(self.library_dir, f"pexels-{video['id']}.mp4")
+        FileUtils(self.config).link_or_copy(file_path, library_path)
+        
+        tags = [tag if isinstance(tag, str) else tag.get("name", "") for tag in video.get("tags", [])]
+        slug = video.get("url", "").rstrip("/").rsplit("/", 1)[-1]
+        text = " ".join([keyword, slug] + tags + [video.get("user", {}).get("name", "")])
+        self.add_clip(
+            library_path, "pexels", text, float(video["duration"]),
+            video_file.get("width") or video.get("width") or 0, video_file.get("height") or video.get("height") or 0,
+            pexels_id=str(video["id"])
+        )
+        self.prune()
+    
+    def prune(self):
+        """Delete the oldest downloaded clips while the library is over its size limit"""
+        conn = self._connect()
+        try:
+            rows = conn.execute("SELECT path FROM clips WHERE source = 'pexels' ORDER BY added").fetchall()
+        finally:
+            conn.close()
+        
+        sizes = {row["path"]: os.path.getsize(row["path"]) for row in rows if os.path.exists(row["path"])}
+        total = sum(sizes.values())
+        for row in rows:
+            if total <= self.max_library_bytes:
+                break
+            path = row["path"]
+            total -= sizes.get(path, 0)
+            if os.path.exists(path):
+                os.remove(path)
+            self.remove_clip(path)
+
+
 class VideoDownloader:
+    _rate_limiter = None
+    _rate_limiter_lock = threading.Lock()
+    _clip_index = None
+    _clip_index_lock = threading.Lock()
+    
     def __init__(self, config_manager):
         self.config = config_manager
         self.pexels_endpoint = "https://api.pexels.com/videos/search"
+        self.rate_limiter = self._get_rate_limiter(config_manager)
+        self.clip_index = self._get_clip_index(config_manager)
+        # Search metadata of every returned link, recorded with the clip once downloaded
+        self.video_metadata = {}
+    
+    @classmethod
+    def _get_rate_limiter(cls, config_manager):
+        """Return the rate limiter shared by all downloaders in this process"""
+        with cls._rate_limiter_lock:
+            if cls._rate_limiter is None:
+                pexels_config = config_manager.config.get("pexels", {})
+                cls._rate_limiter = PexelsRateLimiter(
+                    requests_per_hour=pexels_config.get("requests_per_hour", 200),
+                    burst=pexels_config.get("burst", 10),
+                    prefetch_reserve=pexels_config.get("prefetch_reserve", 3)
+                )
+            return cls._rate_limiter
+    
+    @classmethod
+    def _get_clip_index(cls, config_manager):
+        """Return the local clip index shared by all downloaders in this process"""
+        if not config_manager.config.get("clip_index", {}).get("enabled", True):
+            return None
+        with cls._clip_index_lock:
+            if cls._clip_index is None:
+                cls._clip_index = ClipIndex(config_manager)
+            return cls._clip_index
+    
+    def search_videos(self, keyword, orientation, priority=0, attempts=3):
+        """Search Pexels through the shared rate limiter, returns the response or None"""
+        for attempt in range(attempts):
+            self.rate_limiter.acquire(priority)
+            try:
+                response = requests.get(
+                    self.pexels_endpoint,
+                    headers={"Authorization": self.config.pexels_api_key},
+                    params={"query": keyword, "per_page": 25, "size": "medium", "orientation": orientation},
+                )
+            except requests.RequestException as e:
+                print(f"Error searching Pexels for '{keyword}': {e}")
+                return None
+            
+            self.rate_limiter.update(response)
+            if response.status_code == 429:
+                print(f"Pexels rate limit hit for '{keyword}', retrying ({attempt + 1}/{attempts})")
+                continue
+            if response.status_code != 200:
+                print(f"Pexels search for '{keyword}' failed. Status code: {response.status_code}")
+            return response
+        return None
     
-    def get_video_urls(self, keywords=None, orientation="portrait", duration=5, aantal=None):
+    def get_video_urls(self, keywords=None, orientation="portrait", duration=5, aantal=None, priority=0):
         if not keywords:
             keywords = []
             
         videoUrls = []
         
         for keyword in keywords:
-            response = requests.get(
-                self.pexels_endpoint,
-                headers={"Authorization": self.config.pexels_api_key},
-                params={"query": keyword, "per_page": 25, "size": "medium", "orientation": orientation},
-            )
-            
             totalVideoDuration = 0
             
-            if response.status_code == 200:
+            # Clips on disk answer the keyword without an API call, Pexels is only searched on a miss
+            if self.clip_index:
+                for clip in self.clip_index.search(keyword, orientation, exclude=videoUrls):
+                    if (aantal is None or len(videoUrls) >= aantal) and totalVideoDuration >= duration:
+                        break
+                    videoUrls.append(clip["path"])
+                    totalVideoDuration += clip["duration"]
+                if ((aantal is None or len(videoUrls) >= aantal) and totalVideoDuration >= duration):
+                    print(f"Using local clips for '{keyword}'")
+                    continue
+            
+            response = self.search_videos(keyword, orientation, priority)
+            
+            if response is not None and response.status_code == 200:
                 video_data = response.json()
                 if video_data["videos"]:
                     i = 0
@@ -363,6 +1152,7 @@ class VideoDownloader:
                             continue
                         
                         videoUrls.append(video_data["videos"][i]["video_files"][0]["link"])
+                        self.video_metadata[videoUrls[-1]] = (video_data["videos"][i], keyword)
                         totalVideoDuration += int(video_data["videos"][i]["duration"])
                         
                         i += 1
@@ -370,18 +1160,41 @@ class VideoDownloader:
         return videoUrls
         
     def download_video(self, url, filename):
-        response = requests.get(url, stream=True)
         filename += ".mp4"
         
         file_utils = FileUtils(self.config)
         file_utils.delete_temp_files([filename])
         
+        # Links to clips in the local library are linked in instead of downloaded
+        metadata = self.video_metadata.get(url)
+        local_path = url if os.path.isfile(url) else None
+        if self.clip_index and metadata and not local_path:
+            local_path = self.clip_index.find_pexels_clip(metadata[0]["id"])
+        if local_path:
+            file_utils.check_quota(os.path.getsize(local_path))
+            file_utils.link_or_copy(local_path, os.path.join(self.config.temp_dir, filename))
+            print(f"Video taken from local library: {filename}")
+            return filename
+        
+        response = requests.get(url, stream=True)
         if response.status_code == 200:
+            usage = file_utils.check_quota(int(response.headers.get("Content-Length", 0)))
+            written = 0
             with open(os.path.join(self.config.temp_dir, filename), 'wb') as f:
-                for chunk in response.iter_content(chunk_size=1024):
+                for chunk in response.iter_content(chunk_size=1024 * 1024):
                     if chunk:
                         f.write(chunk)
+                        written += len(chunk)
+                        # Servers may omit or understate Content-Length, so check as data arrives
+                        if self.config.quota_bytes is not None and usage + written > self.config.quota_bytes:
+                            file_utils.check_quota()
             print(f"Video downloaded successfully: {filename}")
+            if self.clip_index and metadata:
+                video, keyword = metadata
+                try:
+                    self.clip_index.add_download(os.path.join(self.config.temp_dir, filename), video, video["video_files"][0], keyword)
+                except Exception as e:
+                    print(f"Error adding {filename} to the clip library: {e}")
         else:
             print(f"Failed to download video. Status code: {response.status_code}")
             
@@ -393,9 +1206,11 @@ class TTSProcessor:
         self.config = config_manager
         self.file_utils = FileUtils(config_manager)
     
-    async def convert_text_to_speech_and_vtt(self, text, filename):
+    async def convert_text_to_speech_and_vtt(self, text, filename, voice=None):
+        import edge_tts
+        
         os.makedirs(self.config.temp_dir, exist_ok=True)
-        speech = edge_tts.Communicate(text, voice=self.config.tts_voice)
+        speech = edge_tts.Communicate(text, voice=voice or self.config.tts_voice)
         
         subtitle_data = []
         filename += ".mp3"
@@ -418,312 +1233,1405 @@ class TTSProcessor:
         return filename, subtitle_data
 
 
-class VideoProcessor:
+class AudioProcessor:
     def __init__(self, config_manager):
         self.config = config_manager
-        self.file_utils = FileUtils(config_manager)
-        self.video_downloader = VideoDownloader(config_manager)
-        self.tts_processor = TTSProcessor(config_manager)
+        audio_config = self.config.config.get("audio", {})
+        self.sample_rate = audio_config.get("sample_rate", 44100)
+        self.target_loudness = audio_config.get("target_loudness", -16.0)
+        self.peak_limit = audio_config.get("peak_limit", -1.0)
     
-    def generate_text_clips(self, subtitle_data, position='center', size=None):
-        size = size or self.config.config["video"]["font_size"]
-        text_clips = []
-
-        for start_time, end_time, text in subtitle_data:
-            start_time = sum(float(x) * 60 ** i for i, x in enumerate(reversed(start_time.split(":"))))
-            end_time = sum(float(x) * 60 ** i for i, x in enumerate(reversed(end_time.split(":"))))
-            duration = end_time - start_time
-
-            text_clip = TextClip(
-                text=text,
-                font=self.config.config["video"]["font"],
-                font_size=size,
-                color='white',
-                margin=(None, 5 if position != 'center' else None)
-            ).with_start(start_time).with_duration(duration).with_position(position)
+    def load_samples(self, audio_path):
+        """Decode an audio file to stereo float PCM samples at the track sample rate"""
+        import numpy as np
+        
+        # ffmpeg decodes the whole stream, moviepy's to_soundarray fails on parts shorter than a second
+        result = subprocess.run(
+            [
+                FileUtils(self.config).ffmpeg_binary(), "-loglevel", "error", "-i", audio_path,
+                "-vn", "-f", "f32le", "-acodec", "pcm_f32le", "-ac", "2", "-ar", str(self.sample_rate), "-"
+            ],
+            capture_output=True,
+            check=True
+        )
+        return np.frombuffer(result.stdout, dtype=np.float32).reshape(-1, 2).copy()
+    
+    def normalize_loudness(self, samples):
+        """Scale samples to the target RMS loudness without exceeding the peak limit"""
+        import numpy as np
+        
+        if samples.size == 0:
+            return samples
+        
+        rms = float(np.sqrt(np.mean(np.square(samples))))
+        if rms <= 0:
+            return samples
+        
+        gain = 10 ** ((self.target_loudness - 20 * np.log10(rms)) / 20)
+        peak = float(np.max(np.abs(samples)))
+        max_gain = 10 ** (self.peak_limit / 20) / peak
+        return samples * min(gain, max_gain)
+    
+    def fit_to_duration(self, audio_file, duration):
+        """Speed up narration that is longer than duration so it fits its slot.
+        
+        Returns the audio filename to use and the factor subtitle times must be scaled by.
+        Audio that already fits is returned unchanged and is padded by build_track.
+        """
+        from moviepy import AudioFileClip
+        
+        audio_clip = AudioFileClip(os.path.join(self.config.temp_dir, audio_file))
+        audio_duration = audio_clip.duration
+        audio_clip.close()
+        
+        if audio_duration <= duration or duration <= 0:
+            return audio_file, 1.0
+        
+        tempo = audio_duration / duration
+        fitted_file = os.path.splitext(audio_file)[0] + "-fitted.wav"
+        subprocess.run(
+            [
+                FileUtils(self.config).ffmpeg_binary(), "-y", "-loglevel", "error",
+                "-i", os.path.join(self.config.temp_dir, audio_file),
+                "-filter:a", f"atempo={tempo:.6f}",
+                "-ar", str(self.sample_rate),
+                os.path.join(self.config.temp_dir, fitted_file)
+            ],
+            check=True
+        )
+        return fitted_file, 1 / tempo
+    
+    def build_track(self, audio_files, filename, slot_durations=None):
+        """Concatenate part audio sample-accurately and encode it once as a single track.
+        
+        With slot_durations every part is padded with silence or trimmed to its slot.
+        Returns the track filename and the (start, end) offset in seconds of every part.
+        """
+        import numpy as np
+        from moviepy import AudioArrayClip
+        
+        parts = [self.load_samples(os.path.join(self.config.temp_dir, audio_file)) for audio_file in audio_files]
+        
+        if slot_durations:
+            slot_start = 0.0
+            for i, slot_duration in enumerate(slot_durations):
+                # Round cumulative positions so slots never drift from the video timeline
+                length = round((slot_start + slot_duration) * self.sample_rate) - round(slot_start * self.sample_rate)
+                slot_start += slot_duration
+                if len(parts[i]) < length:
+                    parts[i] = np.concatenate([parts[i], np.zeros((length - len(parts[i]), parts[i].shape[1]), dtype=np.float32)])
+                else:
+                    parts[i] = parts[i][:length]
+        
+        offsets = []
+        position = 0
+        for samples in parts:
+            offsets.append((position / self.sample_rate, (position + len(samples)) / self.sample_rate))
+            position += len(samples)
+        
+        track = self.normalize_loudness(np.concatenate(parts))
+        
+        filename += ".m4a"
+        FileUtils(self.config).delete_temp_files([filename])
+        AudioArrayClip(track, fps=self.sample_rate).write_audiofile(
+            os.path.join(self.config.temp_dir, filename),
+            fps=self.sample_rate,
+            codec="aac",
+            bitrate="192k",
+            logger=None
+        )
+        return filename, offsets
+    
+    def frame_aligned_durations(self, offsets, fps):
+        """Snap part offsets to frame boundaries so segment durations add up to the track length"""
+        durations = []
+        for start, end in offsets:
+            durations.append((round(end * fps) - round(start * fps)) / fps)
+        return durations
 
-            text_clips.append(text_clip)
 
-        return text_clips
+class RenderProfiler:
+    """Opt-in profiler for VideoProcessor renders.
     
-    async def generate_story_video(self, script):
-        script_data = self.file_utils.decode_json(script)
-        if not script_data:
+    Each stage is profiled with cProfile in the thread that runs it, while a sampling
+    thread collects stacks of every thread inside a stage for flamegraphs. Segment renders
+    additionally split their frame time into source decode, overlay and encode.
+    """
+    
+    def __init__(self, output_dir, sample_interval=0.005):
+        self.output_dir = output_dir
+        self.sample_interval = sample_interval
+        self.lock = threading.Lock()
+        self.samples = collections.Counter()
+        self.thread_stages = {}
+        self.current_stage = None
+        self.stage_times = collections.defaultdict(float)
+        self.stats = {}
+        self.segments = []
+        self._stop_event = None
+        self._sampler = None
+        os.makedirs(output_dir, exist_ok=True)
+    
+    def start(self):
+        if self._sampler:
             return
-            
-        audioFile, subtitle_data = await self.tts_processor.convert_text_to_speech_and_vtt(script_data["script"], "story")
-        textClips = self.generate_text_clips(subtitle_data)
-        audioClip = AudioFileClip(os.path.join(self.config.temp_dir, audioFile))
-        videoClip = VideoFileClip(self.file_utils.get_random_file()).with_duration(audioClip.duration)
+        self._stop_event = threading.Event()
+        self._sampler = threading.Thread(target=self._sample, daemon=True)
+        self._sampler.start()
+    
+    def stop(self):
+        if self._sampler:
+            self._stop_event.set()
+            self._sampler.join()
+            self._sampler = None
+    
+    def _sample(self):
+        own_thread = threading.get_ident()
+        while not self._stop_event.wait(self.sample_interval):
+            for thread_id, frame in sys._current_frames().items():
+                # Worker threads without a stage of their own work for the latest stage entered
+                stage = self.thread_stages.get(thread_id, self.current_stage)
+                if thread_id == own_thread or stage is None:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                    frame = frame.f_back
+                with self.lock:
+                    self.samples[";".join([stage] + stack[::-1])] += 1
+    
+    @contextlib.contextmanager
+    def stage(self, name):
+        """Profile the code run by the current thread inside the block as stage name"""
+        thread_id = threading.get_ident()
+        previous_stage = self.thread_stages.get(thread_id)
+        self.thread_stages[thread_id] = name
+        previous_current_stage = self.current_stage
+        self.current_stage = name
         
-        finalVideo = CompositeVideoClip([videoClip] + textClips)
-        output_file = os.path.join(self.config.output_dir, "story.mp4")
-        finalVideo.write_videofile(
-            filename=output_file,
-            threads=4,
-            preset="ultrafast",
-            audio=os.path.join(self.config.temp_dir, audioFile),
-            temp_audiofile_path=self.config.temp_dir
-        )
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError:
+            # Another profiler is already active in this thread
+            profile = None
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            if profile:
+                profile.disable()
+            with self.lock:
+                self.stage_times[name] += elapsed
+                if profile:
+                    if name in self.stats:
+                        self.stats[name].add(profile)
+                    else:
+                        self.stats[name] = pstats.Stats(profile)
+            self.current_stage = previous_current_stage
+            if previous_stage is None:
+                self.thread_stages.pop(thread_id, None)
+            else:
+                self.thread_stages[thread_id] = previous_stage
+    
+    def time_frames(self, clip, timing, key):
+        """Wrap a clip's frame function so every frame adds its duration to timing[key]"""
+        frame_function = clip.frame_function
         
-        self.file_utils.delete_temp_files([audioFile])
-
-    async def generate_short_video(self, script):
-        script_data = self.file_utils.decode_json(script)
-        if not script_data:
-            return None, None
+        def timed_frame_function(t):
+            start = time.perf_counter()
+            try:
+                return frame_function(t)
+            finally:
+                timing[key] += time.perf_counter() - start
+                timing[key + "_frames"] += 1
         
-        temp_files = []  # Track all temporary files
-        segment_files = []  # Track intermediate video segments
+        clip.frame_function = timed_frame_function
+        return clip
+    
+    def record_segment(self, name, timing, wall_time):
+        frames = int(timing["composite_frames"])
+        with self.lock:
+            self.segments.append({
+                "segment": name,
+                "frames": frames,
+                "decode": timing["decode"],
+                "overlay": timing["composite"] - timing["decode"],
+                "encode": wall_time - timing["composite"],
+                "total": wall_time,
+                "ms_per_frame": wall_time / frames * 1000 if frames else 0.0
+            })
+    
+    def summary_table(self):
+        lines = [f"{'segment':<24} {'frames':>7} {'decode s':>9} {'overlay s':>10} {'encode s':>9} {'total s':>8} {'ms/frame':>9}"]
+        for segment in self.segments:
+            lines.append(
+                f"{segment['segment']:<24} {segment['frames']:>7} {segment['decode']:>9.2f} {segment['overlay']:>10.2f} "
+                f"{segment['encode']:>9.2f} {segment['total']:>8.2f} {segment['ms_per_frame']:>9.1f}"
+            )
+        lines.append("")
+        lines.append(f"{'stage':<24} {'seconds':>9}")
+        for name, seconds in self.stage_times.items():
+            lines.append(f"{name:<24} {seconds:>9.2f}")
+        return "\n".join(lines)
+    
+    def report(self):
+        """Write cProfile stats per stage, folded stacks for flamegraphs and the summary table"""
+        with self.lock:
+            for name, stats in self.stats.items():
+                stats.dump_stats(os.path.join(self.output_dir, f"{name}.prof"))
+            with open(os.path.join(self.output_dir, "profile.folded"), 'w') as f:
+                for stack, count in sorted(self.samples.items()):
+                    f.write(f"{stack} {count}\n")
+        summary = self.summary_table()
+        with open(os.path.join(self.output_dir, "summary.txt"), 'w') as f:
+            f.write(summary + "\n")
+        print(summary)
+        print(f"Profile written to {self.output_dir}")
+
+
+class ConcurrencyController:
+    """Sizes the number of concurrent downloads and segment renders to a memory budget.
+    
+    A sampling thread watches the RSS of this process and its ffmpeg children together with
+    the memory the system has available. Limits are halved as soon as the process nears its
+    ceiling, available memory runs low or the system starts swapping, and grow by one slot
+    per sample while there is headroom and every slot is busy.
+    """
+    
+    def __init__(self, limits, max_rss_mb=None, min_available_mb=512, sample_interval=1.0):
+        self.max_limits = dict(limits)
+        # Renders are the memory hungry kind, they start with one slot and ramp up
+        self.limits = {kind: 1 if kind == "render" else limit for kind, limit in self.max_limits.items()}
+        self.in_use = {kind: 0 for kind in self.max_limits}
+        self.min_available = min_available_mb * 1024 * 1024
+        self.sample_interval = sample_interval
+        self.condition = threading.Condition()
+        self._sampler = None
+        self._swapped_out = None
         
         try:
-            # Process script parts in batches to manage memory efficiently
-            for i, part in enumerate(script_data["script"]):
-                all_created_clips = []  # Track all clips for proper closing within this batch
-                
-                audioFile, subtitle_data = await self.tts_processor.convert_text_to_speech_and_vtt(part["text"], f"shortVideoPart-{i}")
-                audioClip = AudioFileClip(os.path.join(self.config.temp_dir, audioFile))
-                all_created_clips.append(audioClip)
-                temp_files.append(audioFile)
-                
-                textClips = self.generate_text_clips(subtitle_data)
+            import psutil
+            self.psutil = psutil
+        except ImportError:
+            self.psutil = None
+        
+        total = self.system_memory()[0]
+        if max_rss_mb:
+            self.max_rss = max_rss_mb * 1024 * 1024
+        else:
+            # Leave room for the OS and whatever else runs on the box
+            self.max_rss = int(total * 0.7) if total else None
+    
+    def system_memory(self):
+        """Return total and available system memory in bytes, None when unknown"""
+        if self.psutil:
+            memory = self.psutil.virtual_memory()
+            return memory.total, memory.available
+        try:
+            info = {}
+            with open("/proc/meminfo") as f:
+                for line in f:
+                    name, value = line.split(":", 1)
+                    info[name] = int(value.split()[0]) * 1024
+            return info.get("MemTotal"), info.get("MemAvailable", info.get("MemFree"))
+        except (OSError, ValueError):
+            return None, None
+    
+    def process_rss(self):
+        """Return the RSS of this process plus its child processes in bytes"""
+        if self.psutil:
+            process = self.psutil.Process()
+            total = process.memory_info().rss
+            for child in process.children(recursive=True):
+                try:
+                    total += child.memory_info().rss
+                except self.psutil.Error:
+                    pass
+            return total
+        
+        page_size = os.sysconf("SC_PAGE_SIZE")
+        pids = {os.getpid()}
+        total = 0
+        try:
+            stats = []
+            for name in os.listdir("/proc"):
+                if not name.isdigit():
+                    continue
+                try:
+                    with open(f"/proc/{name}/stat") as f:
+                        fields = f.read().rsplit(")", 1)[1].split()
+                    # Fields after the command name start at the state, ppid and rss follow
+                    stats.append((int(name), int(fields[1]), int(fields[21])))
+                except (OSError, IndexError, ValueError):
+                    continue
+        except OSError:
+            return None
+        
+        # Walk the process tree from this process down to every descendant
+        children = collections.defaultdict(list)
+        for pid, ppid, rss in stats:
+            children[ppid].append((pid, rss))
+        pending = [os.getpid()]
+        for pid, ppid, rss in stats:
+            if pid == os.getpid():
+                total += rss * page_size
+        while pending:
+            for pid, rss in children.get(pending.pop(), []):
+                if pid not in pids:
+                    pids.add(pid)
+                    pending.append(pid)
+                    total += rss * page_size
+        return total
+    
+    def swapped_out(self):
+        """Return the number of pages the system has swapped out since boot"""
+        if self.psutil:
+            return self.psutil.swap_memory().sout
+        try:
+            with open("/proc/vmstat") as f:
+                for line in f:
+                    if line.startswith("pswpout "):
+                        return int(line.split()[1])
+        except (OSError, ValueError):
+            pass
+        return None
+    
+    def adjust(self):
+        """Sample memory once and move the limits towards the budget"""
+        rss = self.process_rss()
+        available = self.system_memory()[1]
+        swapped_out = self.swapped_out()
+        swapping = self._swapped_out is not None and swapped_out is not None and swapped_out > self._swapped_out
+        self._swapped_out = swapped_out
+        
+        pressure = swapping
+        headroom = not swapping
+        if self.max_rss and rss is not None:
+            pressure = pressure or rss > self.max_rss * 0.85
+            headroom = headroom and rss < self.max_rss * 0.6
+        if available is not None:
+            pressure = pressure or available < self.min_available
+            headroom = headroom and available > self.min_available * 2
+        
+        with self.condition:
+            for kind, limit in self.limits.items():
+                if pressure:
+                    self.limits[kind] = max(1, limit // 2)
+                elif headroom and self.in_use[kind] >= limit:
+                    self.limits[kind] = min(self.max_limits[kind], limit + 1)
+            self.condition.notify_all()
+        return pressure
+    
+    def _sample(self):
+        while True:
+            try:
+                self.adjust()
+            except Exception as e:
+                print(f"Error sampling memory usage: {e}")
+            time.sleep(self.sample_interval)
+    
+    def _start(self):
+        with self.condition:
+            if self._sampler is None:
+                self._sampler = threading.Thread(target=self._sample, daemon=True)
+                self._sampler.start()
+    
+    def try_acquire(self, kind):
+        self._start()
+        with self.condition:
+            if self.in_use[kind] < self.limits[kind]:
+                self.in_use[kind] += 1
+                return True
+            return False
+    
+    def acquire(self, kind):
+        """Block until a slot of the given kind is free"""
+        self._start()
+        with self.condition:
+            while self.in_use[kind] >= self.limits[kind]:
+                self.condition.wait(self.sample_interval)
+            self.in_use[kind] += 1
+    
+    def release(self, kind):
+        with self.condition:
+            self.in_use[kind] -= 1
+            self.condition.notify_all()
+    
+    @contextlib.asynccontextmanager
+    async def slot(self, kind):
+        """Hold a slot of the given kind without blocking the event loop"""
+        # Polling keeps waiters off the thread pool that the slot holders render in
+        while not self.try_acquire(kind):
+            await asyncio.sleep(0.05)
+        try:
+            yield
+        finally:
+            self.release(kind)
+
+
+class SharedFrameSource:
+    """Plays a list of clips back to back and decodes each requested frame only once.
+    
+    Several output clips can read from the same source at the same timestamp, e.g. to
+    crop one stock clip to different aspect ratios.
+    """
+    
+    def __init__(self, clips):
+        self.clips = clips
+        self.starts = []
+        position = 0
+        for clip in clips:
+            self.starts.append(position)
+            position += clip.duration
+        self.last_t = None
+        self.last_frame = None
+    
+    def get_frame(self, t):
+        if t != self.last_t:
+            index = max(bisect.bisect_right(self.starts, t) - 1, 0)
+            clip = self.clips[index]
+            # Clamp to the clip end so rounding at boundaries never reads past it
+            local_t = min(t - self.starts[index], max(clip.duration - 1e-3, 0))
+            self.last_frame = clip.get_frame(local_t)
+            self.last_t = t
+        return self.last_frame
+
+
+class EncoderProfiles:
+    """Encoder settings per video type and role, calibrated for each class of host.
+    
+    Roles are 'final' for deliverable output and 'intermediate' for files that are decoded
+    again by a later render. Profiles live in the cache keyed by CPU architecture and core
+    count, so one file can serve a whole fleet.
+    """
+    
+    def __init__(self, config_manager):
+        self.path = os.path.join(config_manager.cache_dir, "encoder_profiles.json")
+        self.host_class = f"{platform.machine()}-{os.cpu_count()}cpu"
+    
+    def load(self):
+        try:
+            with open(self.path, 'r') as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {}
+    
+    def save(self, profiles):
+        """Store the profiles of this host class next to those of other hosts"""
+        data = self.load()
+        data[self.host_class] = {"calibrated": datetime.now().isoformat(), "profiles": profiles}
+        with open(self.path, 'w') as f:
+            json.dump(data, f, indent=2)
+    
+    def get(self, video_type, role):
+        return self.load().get(self.host_class, {}).get("profiles", {}).get(video_type, {}).get(role)
+    
+    def params(self, video_type, role):
+        """Return write_videofile encoder arguments for a profile, None when not calibrated"""
+        profile = self.get(video_type, role)
+        if not profile:
+            return None
+        return {"threads": profile["threads"], "preset": profile["preset"], "ffmpeg_params": ["-crf", str(profile["crf"])]}
+
+
+class EncoderAutotuner:
+    """Benchmarks x264 settings on synthetic frames to pick encoder profiles for this host"""
+    
+    def __init__(self, config_manager):
+        self.config = config_manager
+        self.file_utils = FileUtils(config_manager)
+        self.profiles = EncoderProfiles(config_manager)
+        self.fps = self.config.config["video"].get("fps", 30)
+        settings = self.config.config.get("autotune", {})
+        self.seconds = settings.get("seconds", 2)
+        self.presets = settings.get("presets", ["ultrafast", "superfast", "veryfast", "faster", "fast", "medium"])
+        self.crf_values = settings.get("crf", [18, 20, 23, 26])
+        # Quality is judged against the best SSIM any trial reached, since grain caps it below 1
+        self.final_ssim_drop = settings.get("final_ssim_drop", 0.01)
+        self.final_min_speed = settings.get("final_min_speed", 1.0)
+        self.intermediate_ssim_drop = settings.get("intermediate_ssim_drop", 0.003)
+    
+    def make_source(self, video_format, path):
+        """Write raw synthetic frames with motion and film grain, like stock footage"""
+        width, height = video_format["width"], video_format["height"]
+        subprocess.run(
+            [
+                self.file_utils.ffmpeg_binary(), "-y", "-loglevel", "error",
+                "-f", "lavfi", "-i", f"testsrc2=size={width}x{height}:rate={self.fps}:duration={self.seconds},noise=alls=4:allf=t",
+                "-f", "rawvideo", "-pix_fmt", "yuv420p", path
+            ],
+            check=True
+        )
+    
+    def raw_input(self, video_format, path):
+        return ["-f", "rawvideo", "-pix_fmt", "yuv420p", "-s", f"{video_format['width']}x{video_format['height']}", "-r", str(self.fps), "-i", path]
+    
+    def trial(self, video_format, source, preset, crf, threads):
+        """Encode the source once, returns encode speed as a multiple of realtime and output size"""
+        output = os.path.join(self.config.temp_dir, "autotune.mp4")
+        start = time.perf_counter()
+        subprocess.run(
+            [self.file_utils.ffmpeg_binary(), "-y", "-loglevel", "error"] + self.raw_input(video_format, source) +
+            ["-c:v", "libx264", "-preset", preset, "-crf", str(crf), "-threads", str(threads), "-pix_fmt", "yuv420p", output],
+            check=True
+        )
+        elapsed = time.perf_counter() - start
+        return {
+            "preset": preset,
+            "crf": crf,
+            "threads": threads,
+            "speed": self.seconds / elapsed,
+            "size": os.path.getsize(output),
+            "output": output
+        }
+    
+    def ssim(self, video_format, output, source):
+        result = subprocess.run(
+            [self.file_utils.ffmpeg_binary(), "-loglevel", "info", "-i", output] + self.raw_input(video_format, source) +
+            ["-lavfi", "[0:v][1:v]ssim", "-f", "null", "-"],
+            capture_output=True, text=True, check=True
+        )
+        return float(result.stderr.rsplit("All:", 1)[1].split()[0])
+    
+    def tune_threads(self, video_format, source):
+        """Return the fewest threads within 10% of the fastest encode, leaving cores for parallel renders"""
+        cpu_count = os.cpu_count() or 1
+        candidates = sorted({threads for threads in (1, 2, 4, 8, 16) if threads <= cpu_count} | {cpu_count})
+        speeds = {threads: self.trial(video_format, source, "veryfast", 23, threads)["speed"] for threads in candidates}
+        best = max(speeds.values())
+        return min(threads for threads, speed in speeds.items() if speed >= best * 0.9)
+    
+    def choose(self, trials):
+        """Pick the intermediate and final profile from the benchmarked trials"""
+        best_ssim = max(trial["ssim"] for trial in trials)
+        usable = [trial for trial in trials if trial["ssim"] >= best_ssim - self.intermediate_ssim_drop]
+        fastest = max(trial["speed"] for trial in usable)
+        # Intermediates are decoded again soon, so speed wins and size only breaks near-ties
+        intermediate = min((trial for trial in usable if trial["speed"] >= fastest * 0.95), key=lambda trial: trial["size"])
+        
+        fast_enough = [trial for trial in trials if trial["speed"] >= self.final_min_speed] or [max(trials, key=lambda trial: trial["speed"])]
+        usable = [trial for trial in fast_enough if trial["ssim"] >= best_ssim - self.final_ssim_drop]
+        if usable:
+            # Deliverables are stored and uploaded, so the smallest file that looks right wins
+            final = min(usable, key=lambda trial: trial["size"])
+        else:
+            final = max(fast_enough, key=lambda trial: trial["ssim"])
+        
+        return {
+            role: {key: trial[key] for key in ("preset", "crf", "threads", "speed", "size", "ssim")}
+            for role, trial in (("intermediate", intermediate), ("final", final))
+        }
+    
+    def tune_format(self, video_type):
+        video_format = self.config.config["video"][f"{video_type}_format"]
+        source = os.path.join(self.config.temp_dir, f"autotune-{video_type}.yuv")
+        try:
+            self.make_source(video_format, source)
+            threads = self.tune_threads(video_format, source)
+            trials = []
+            for preset in self.presets:
+                for crf in self.crf_values:
+                    trial = self.trial(video_format, source, preset, crf, threads)
+                    trial["ssim"] = self.ssim(video_format, trial["output"], source)
+                    trials.append(trial)
+                    print(f"{video_type} {preset:<10} crf {crf:<3} threads {threads:<3} {trial['speed']:6.2f}x realtime "
+                          f"{trial['size'] / 1024:8.0f} KB ssim {trial['ssim']:.4f}")
+            return self.choose(trials)
+        finally:
+            for path in (source, os.path.join(self.config.temp_dir, "autotune.mp4")):
+                if os.path.exists(path):
+                    os.remove(path)
+    
+    def run(self, video_types=("short", "long")):
+        profiles = {video_type: self.tune_format(video_type) for video_type in video_types}
+        self.profiles.save(profiles)
+        for video_type, roles in profiles.items():
+            for role, profile in roles.items():
+                print(f"{self.profiles.host_class} {video_type} {role}: preset {profile['preset']}, crf {profile['crf']}, threads {profile['threads']}")
+        print(f"Encoder profiles saved to {self.profiles.path}")
+        return profiles
+
+
+class VideoProcessor:
+    _concurrency = None
+    _concurrency_lock = threading.Lock()
+    
+    def __init__(self, config_manager, draft=False):
+        self.config = config_manager
+        self.file_utils = FileUtils(config_manager)
+        self.video_downloader = VideoDownloader(config_manager)
+        self.tts_processor = TTSProcessor(config_manager)
+        self.audio_processor = AudioProcessor(config_manager)
+        self.concurrency = self._get_concurrency(config_manager)
+        self.encoder_profiles = EncoderProfiles(config_manager)
+        self.fps = self.config.config["video"].get("fps", 30)
+        
+        # Draft renders run the same timeline at a fraction of the resolution and fps
+        self.draft = draft
+        self.draft_settings = self.config.config.get("draft", {})
+        if draft:
+            self.fps = max(1, round(self.fps * self.draft_settings.get("fps_scale", 0.5)))
+        
+        self.profiler = None
+        profiling_config = self.config.config.get("profiling", {})
+        if profiling_config.get("enabled"):
+            self.profiler = RenderProfiler(
+                os.path.join(profiling_config.get("output_dir", "./profiles"), f"{int(time.time() * 1000)}-{id(self):x}"),
+                profiling_config.get("sample_interval", 0.005)
+            )
+    
+    @classmethod
+    def _get_concurrency(cls, config_manager):
+        """Return the concurrency controller shared by all video processors in this process"""
+        with cls._concurrency_lock:
+            if cls._concurrency is None:
+                concurrency_config = config_manager.config.get("concurrency", {})
+                cls._concurrency = ConcurrencyController(
+                    {
+                        "download": concurrency_config.get("max_downloads", 4),
+                        "tts": concurrency_config.get("max_tts", 4),
+                        "render": concurrency_config.get("max_renders", 2)
+                    },
+                    max_rss_mb=concurrency_config.get("max_rss_mb"),
+                    min_available_mb=concurrency_config.get("min_available_mb", 512),
+                    sample_interval=concurrency_config.get("sample_interval", 1.0)
+                )
+            return cls._concurrency
+    
+    async def synthesize(self, text, filename, voice=None):
+        """Run TTS once the concurrency controller grants a slot, so parts don't open unbounded connections"""
+        async with self.concurrency.slot("tts"):
+            # Refuse new work once the job's workspace is full instead of finding out after the render
+            self.file_utils.check_quota()
+            return await self.tts_processor.convert_text_to_speech_and_vtt(text, filename, voice)
+    
+    async def run_render(self, function, *args):
+        """Run a blocking render in a thread once the concurrency controller grants a render slot"""
+        async with self.concurrency.slot("render"):
+            self.file_utils.check_quota()
+            return await asyncio.to_thread(function, *args)
+    
+    def profile_stage(self, name):
+        """Profile a block when profiling is enabled"""
+        return self.profiler.stage(name) if self.profiler else contextlib.nullcontext()
+    
+    def get_layout(self, video_type):
+        """Return the rendering settings for a 'short' or 'long' video"""
+        layout = self._base_layout(video_type)
+        return self.scale_layout(layout) if self.draft else layout
+    
+    def _base_layout(self, video_type):
+        if video_type == "short":
+            return {
+                "video_type": "short",
+                "format": self.config.config["video"]["short_format"],
+                "orientation": "portrait",
+                "text_position": "center",
+                "font_size": self.config.config["video"]["font_size"],
+                "clip_count": 3,
+                "part_prefix": "shortVideoPart",
+                "segment_prefix": "segment",
+                "output_name": "shortVideo.mp4"
+            }
+        return {
+            "video_type": "long",
+            "format": self.config.config["video"]["long_format"],
+            "orientation": "landscape",
+            "text_position": "bottom",
+            "font_size": 50,
+            "clip_count": None,
+            "part_prefix": "longVideoPart",
+            "segment_prefix": "long_segment",
+            "output_name": "longVideo.mp4"
+        }
+    
+    def scale_layout(self, layout):
+        """Return a copy of layout sized for a draft render"""
+        scale = self.draft_settings.get("scale", 0.33)
+        layout = dict(layout)
+        layout["format"] = {
+            # x264 needs even dimensions
+            "width": max(2, int(layout["format"]["width"] * scale) // 2 * 2),
+            "height": max(2, int(layout["format"]["height"] * scale) // 2 * 2)
+        }
+        layout["font_size"] = max(8, round(layout["font_size"] * scale))
+        layout["segment_prefix"] = "draft_" + layout["segment_prefix"]
+        layout["output_name"] = "draft_" + layout["output_name"]
+        return layout
+    
+    def get_encoder_params(self, video_type=None, role="final"):
+        """Return the write_videofile encoder arguments for this processor.
+        
+        Uses the host's autotuned profile for video_type and role when there is one.
+        """
+        profile = self.encoder_profiles.params(video_type, role) if video_type else None
+        if self.draft:
+            return {
+                "threads": profile["threads"] if profile else 4,
+                "preset": "ultrafast",
+                "ffmpeg_params": ["-crf", str(self.draft_settings.get("crf", 35)), "-tune", "fastdecode"]
+            }
+        return profile or {"threads": 4, "preset": "ultrafast"}
+    
+    def parse_timestamp(self, timestamp):
+        """Convert an H:MM:SS.ff subtitle timestamp to seconds"""
+        return sum(float(x) * 60 ** i for i, x in enumerate(reversed(timestamp.split(":"))))
+    
+    def generate_text_clips(self, subtitle_data, position='center', size=None):
+        from moviepy import TextClip
+        
+        size = size or self.config.config["video"]["font_size"]
+        text_clips = []
+
+        for start_time, end_time, text in subtitle_data:
+            start_time = self.parse_timestamp(start_time)
+            end_time = self.parse_timestamp(end_time)
+            duration = end_time - start_time
+
+            text_clip = TextClip(
+                text=text,
+                font=self.config.config["video"]["font"],
+                font_size=size,
+                color='white',
+                margin=(None, 5 if position != 'center' else None)
+            ).with_start(start_time).with_duration(duration).with_position(position)
+
+            text_clips.append(text_clip)
+
+        return text_clips
+    
+    async def generate_story_video(self, script):
+        from moviepy import VideoFileClip, CompositeVideoClip, AudioFileClip
+        
+        script_data = self.file_utils.decode_json(script)
+        if not script_data:
+            return
+            
+        audioFile, subtitle_data = await self.synthesize(script_data["script"], "story")
+        textClips = self.generate_text_clips(subtitle_data)
+        audioClip = AudioFileClip(os.path.join(self.config.temp_dir, audioFile))
+        videoClip = VideoFileClip(self.file_utils.get_random_file()).with_duration(audioClip.duration)
+        
+        finalVideo = CompositeVideoClip([videoClip] + textClips)
+        output_file = os.path.join(self.config.output_dir, "story.mp4")
+        finalVideo.write_videofile(
+            filename=output_file,
+            audio=os.path.join(self.config.temp_dir, audioFile),
+            temp_audiofile_path=self.config.temp_dir,
+            # Stories are rendered at the background clip's size, the short profile is the closest fit
+            **self.get_encoder_params("short")
+        )
+        
+        self.file_utils.delete_temp_files([audioFile])
+
+    async def prepare_part(self, i, part, layout, priority=None):
+        """Run TTS for a script part and download the stock clips that will cover it.
+        
+        Searches are prioritized by part index unless a priority is given, so the part that
+        renders first is searched first.
+        """
+        from moviepy import AudioFileClip
+        
+        priority = i if priority is None else priority
+        audioFile, subtitle_data = await self.synthesize(part["text"], f"{layout['part_prefix']}-{i}")
+        audioClip = AudioFileClip(os.path.join(self.config.temp_dir, audioFile))
+        duration = audioClip.duration
+        audioClip.close()
+        
+        # Search and downloads are blocking, keep them off the event loop so parts can overlap
+        videoUrls = await asyncio.to_thread(self.video_downloader.get_video_urls, part["keyword"], layout["orientation"], duration, layout["clip_count"], priority)
+        
+        async def download(a, url):
+            async with self.concurrency.slot("download"):
+                return await asyncio.to_thread(self.video_downloader.download_video, url, f"pexelsClip-{i}-{a}")
+        
+        clip_files = list(await asyncio.gather(*[download(a, url) for a, url in enumerate(videoUrls)]))
+        
+        return {
+            "audio_file": audioFile,
+            "subtitle_data": subtitle_data,
+            "clip_files": clip_files
+        }
+    
+    def fit_clip_duration(self, clip, duration):
+        """Loop a clip that is too short or cut one that is too long"""
+        from moviepy import vfx
+        
+        if clip.duration < duration:
+            return clip.with_effects([vfx.Loop(duration=duration)])
+        return clip.with_duration(duration)
+    
+    def load_source_clips(self, i, prepared_part, duration, all_created_clips, size=None):
+        """Open a part's stock clips, each fitted to an equal share of the part duration.
+        
+        Falls back to a random background video when none of the clips can be loaded.
+        Opened clips are appended to all_created_clips so the caller can close them.
+        """
+        from moviepy import VideoFileClip
+        
+        videoClips = []
+        clip_files = prepared_part["clip_files"]
+        for fileName in clip_files:
+            try:
+                video_clip = VideoFileClip(os.path.join(self.config.temp_dir, fileName), target_resolution=size)
+                all_created_clips.append(video_clip)
+                videoClips.append(self.fit_clip_duration(video_clip, duration / len(clip_files)))
+            except Exception as e:
+                print(f"Error loading video clip {fileName}: {e}")
+                continue
+        
+        if not videoClips:
+            # Fallback if no videos were successfully loaded
+            print(f"No valid video clips for part {i}, using a background video")
+            background = VideoFileClip(self.file_utils.get_random_file(), target_resolution=size)
+            all_created_clips.append(background)
+            videoClips = [self.fit_clip_duration(background, duration)]
+        
+        return videoClips
+    
+    def render_segment(self, i, prepared_part, duration, layout, segment_filename=None):
+        """Render the video-only segment for one script part, returns its filename or None"""
+        from moviepy import CompositeVideoClip, concatenate_videoclips
+        
+        all_created_clips = []  # Track all clips for proper closing within this segment
+        video_format = layout["format"]
+        size = (video_format["width"], video_format["height"])
+        
+        try:
+            textClips = []
+            if layout.get("burn_subtitles", True):
+                textClips = self.generate_text_clips(prepared_part["subtitle_data"], layout["text_position"], layout["font_size"])
+                all_created_clips.extend(textClips)
+            
+            videoClips = self.load_source_clips(i, prepared_part, duration, all_created_clips, size)
+            
+            # Use compose method which is better for transitions
+            concatenated_video = concatenate_videoclips(videoClips, method="compose")
+            # Ensure the video duration matches the part's slot in the audio track
+            concatenated_video = concatenated_video.with_duration(duration)
+            timing = collections.defaultdict(float)
+            if self.profiler:
+                concatenated_video = self.profiler.time_frames(concatenated_video, timing, "decode")
+            composite_clip = CompositeVideoClip([concatenated_video] + textClips, size=size).with_duration(duration)
+            if self.profiler:
+                # The composite frame includes the decode, the rest of it is overlay work
+                composite_clip = self.profiler.time_frames(composite_clip, timing, "composite")
+            all_created_clips.append(composite_clip)
+            
+            # Audio is muxed once from the assembled track, so segments are video only
+            segment_filename = segment_filename or f"{layout['segment_prefix']}_{i}.mp4"
+            start = time.perf_counter()
+            with self.profile_stage(f"segment_{i}"):
+                composite_clip.write_videofile(
+                    filename=os.path.join(self.config.temp_dir, segment_filename),
+                    fps=self.fps,
+                    audio=False,
+                    **self.get_encoder_params(layout.get("video_type"))
+                )
+            if self.profiler:
+                self.profiler.record_segment(segment_filename, timing, time.perf_counter() - start)
+            return segment_filename
+        except Exception as e:
+            print(f"Error creating composite clip for part {i}: {e}")
+            return None
+        finally:
+            # Close all clips in this segment to release memory
+            for clip in all_created_clips:
+                try:
+                    clip.close()
+                except Exception as e:
+                    print(f"Error closing clip: {e}")
+    
+    def crop_to_format(self, frame, video_format):
+        """Center-crop a frame to the aspect ratio of video_format and resize it to that size"""
+        import numpy as np
+        from PIL import Image
+        
+        width, height = video_format["width"], video_format["height"]
+        frame_height, frame_width = frame.shape[:2]
+        if frame_width / frame_height > width / height:
+            crop_width = round(frame_height * width / height)
+            x = (frame_width - crop_width) // 2
+            frame = frame[:, x:x + crop_width]
+        else:
+            crop_height = round(frame_width * height / width)
+            y = (frame_height - crop_height) // 2
+            frame = frame[y:y + crop_height]
+        return np.asarray(Image.fromarray(frame).resize((width, height), Image.BILINEAR))
+    
+    def render_multi_segment(self, i, prepared_part, duration, layouts):
+        """Render one part for several layouts from a single decode of its source clips.
+        
+        Returns the segment filename for every layout, or None when rendering failed.
+        """
+        from moviepy import VideoClip, CompositeVideoClip
+        from moviepy.video.io.ffmpeg_writer import FFMPEG_VideoWriter
+        
+        all_created_clips = []  # Track all clips for proper closing within this segment
+        writers = []
+        
+        try:
+            source = SharedFrameSource(self.load_source_clips(i, prepared_part, duration, all_created_clips))
+            
+            outputs = []
+            for layout in layouts:
+                video_format = layout["format"]
+                size = (video_format["width"], video_format["height"])
+                textClips = self.generate_text_clips(prepared_part["subtitle_data"], layout["text_position"], layout["font_size"])
                 all_created_clips.extend(textClips)
                 
-                videoUrls = self.video_downloader.get_video_urls(part["keyword"], duration=audioClip.duration, aantal=3)
-                
-                videoClips = []
-                video_filenames = []
-                
-                for a, url in enumerate(videoUrls):
-                    fileName = self.video_downloader.download_video(url, f"pexelsClip-{i}-{a}")
-                    video_filenames.append(fileName)
-                    try:
-                        short_format = self.config.config["video"]["short_format"]
-                        video_clip = VideoFileClip(os.path.join(self.config.temp_dir, fileName), target_resolution=(short_format["width"], short_format["height"]))
-                        
-                        if video_clip.duration < audioClip.duration / len(videoUrls):
-                            video_clip = video_clip.loop(duration=audioClip.duration / len(videoUrls))
-                        else:
-                            video_clip = video_clip.with_duration(audioClip.duration / len(videoUrls))
-                        
-                        all_created_clips.append(video_clip)
-                        videoClips.append(video_clip)
-                    except Exception as e:
-                        print(f"Error loading video clip {fileName}: {e}")
-                        continue
-                    
-                # Track all downloaded video files
-                temp_files.extend(video_filenames)
-                
-                if not videoClips:
-                    # Fallback if no videos were successfully loaded
-                    print(f"No valid video clips for part {i}, using a background video")
-                    background = VideoFileClip(self.file_utils.get_random_file()).with_duration(audioClip.duration)
-                    all_created_clips.append(background)
-                    videoClips = [background]
+                cropped = VideoClip(
+                    frame_function=lambda t, video_format=video_format: self.crop_to_format(source.get_frame(t), video_format),
+                    duration=duration
+                )
+                composite_clip = CompositeVideoClip([cropped] + textClips, size=size).with_duration(duration)
+                all_created_clips.append(composite_clip)
                 
-                # Create the composite clip and save it as a segment
+                segment_filename = f"{layout['segment_prefix']}_{i}.mp4"
+                encoder_params = self.get_encoder_params(layout.get("video_type"))
+                writers.append(FFMPEG_VideoWriter(
+                    os.path.join(self.config.temp_dir, segment_filename),
+                    size,
+                    self.fps,
+                    preset=encoder_params["preset"],
+                    threads=encoder_params["threads"],
+                    ffmpeg_params=encoder_params.get("ffmpeg_params")
+                ))
+                outputs.append((composite_clip, segment_filename))
+            
+            # Every output pulls the same timestamp, so each source frame is decoded once
+            frame_count = round(duration * self.fps)
+            for n in range(frame_count):
+                t = n / self.fps
+                for (composite_clip, _), writer in zip(outputs, writers):
+                    writer.write_frame(composite_clip.get_frame(t).astype("uint8"))
+            
+            return [segment_filename for _, segment_filename in outputs]
+        except Exception as e:
+            print(f"Error creating multi-format segments for part {i}: {e}")
+            return None
+        finally:
+            for writer in writers:
                 try:
-                    # Use compose method which is better for transitions
-                    concatenated_video = concatenate_videoclips(videoClips, method="compose")
-                    # Ensure the video duration matches the audio duration
-                    concatenated_video = concatenated_video.with_duration(audioClip.duration)
-                    composite_clip = CompositeVideoClip([concatenated_video] + textClips)
-                    composite_clip = composite_clip.with_duration(audioClip.duration).with_audio(audioClip)
-                    all_created_clips.append(composite_clip)
-                    
-                    # Save this segment to a temporary file
-                    segment_filename = f"segment_{i}.mp4"
-                    segment_path = os.path.join(self.config.temp_dir, segment_filename)
-                    composite_clip.write_videofile(
-                        filename=segment_path,
-                        threads=4,
-                        preset="ultrafast",
-                        temp_audiofile_path=self.config.temp_dir
-                    )
-                    segment_files.append(segment_filename)
+                    writer.close()
                 except Exception as e:
-                    print(f"Error creating composite clip for part {i}: {e}")
-                    continue
-                finally:
-                    # Close all clips in this batch to release memory
-                    for clip in all_created_clips:
-                        try:
-                            clip.close()
-                        except Exception as e:
-                            print(f"Error closing clip: {e}")
-            
-            # Combine all segments
-            output_file = None
-            if segment_files:
+                    print(f"Error closing writer: {e}")
+            for clip in all_created_clips:
                 try:
-                    # Load segments as clips
-                    segment_clips = []
-                    for segment in segment_files:
-                        segment_path = os.path.join(self.config.temp_dir, segment)
-                        clip = VideoFileClip(segment_path)
-                        segment_clips.append(clip)
-                    
-                    finalVideo = concatenate_videoclips(segment_clips, method="compose")
-                    output_file = os.path.join(self.config.output_dir, "shortVideo.mp4")
-                    finalVideo.write_videofile(
-                        filename=output_file,
-                        threads=4,                        
-                        preset="ultrafast",
-                        temp_audiofile_path=self.config.temp_dir
-                    )
-                    
-                    # Close the segment clips
-                    for clip in segment_clips:
-                        clip.close()
+                    clip.close()
                 except Exception as e:
-                    print(f"Error rendering final video: {e}")
+                    print(f"Error closing clip: {e}")
+    
+    async def generate_multi_format_video(self, script_data, video_types):
+        """Render one script and one set of assets to several formats in a single pass.
+        
+        Stock clips are searched with the orientation of the first format. Returns a dict
+        mapping each video type to its output file, empty when rendering failed.
+        """
+        layouts = [self.get_layout(video_type) for video_type in video_types]
+        asset_files = []  # Track TTS audio and downloaded clips
+        temp_files = []  # Track all other temporary files
+        segment_files = {video_type: [] for video_type in video_types}
+        
+        try:
+            parts = []
+            for i, part in enumerate(script_data["script"]):
+                prepared_part = await self.prepare_part(i, part, layouts[0])
+                asset_files.append(prepared_part["audio_file"])
+                asset_files.extend(prepared_part["clip_files"])
+                parts.append(prepared_part)
+            
+            if not parts:
+                return {}
             
-            return output_file, script_data
+            track_file, offsets = self.audio_processor.build_track(
+                [prepared_part["audio_file"] for prepared_part in parts],
+                f"{layouts[0]['part_prefix']}-multi-track"
+            )
+            temp_files.append(track_file)
+            durations = self.audio_processor.frame_aligned_durations(offsets, self.fps)
+            
+            for i, prepared_part in enumerate(parts):
+                part_segments = await self.run_render(self.render_multi_segment, i, prepared_part, durations[i], layouts)
+                if not part_segments:
+                    print(f"Aborting render, segment {i} could not be created")
+                    return {}
+                for video_type, segment_file in zip(video_types, part_segments):
+                    segment_files[video_type].append(segment_file)
+            
+            output_files = {}
+            for video_type, layout in zip(video_types, layouts):
+                output_file = os.path.join(self.config.output_dir, layout["output_name"])
+                try:
+                    output_files[video_type] = self.mux_segments(segment_files[video_type], track_file, output_file)
+                except Exception as e:
+                    print(f"Error rendering final {video_type} video: {e}")
+            return output_files
         finally:
             # Delete temporary files
+            self.file_utils.delete_temp_files(asset_files)
             self.file_utils.delete_temp_files(temp_files)
-            self.file_utils.delete_temp_files(segment_files)
+            for files in segment_files.values():
+                self.file_utils.delete_temp_files(files)
     
-    async def generate_long_video(self, script):
-        script_data = self.file_utils.decode_json(script)
-        if not script_data:
-            return None
+    def mux_segments(self, segment_files, audio_file, output_file):
+        """Join the video segments and the audio track without re-encoding either.
         
-        temp_files = []  # Track all temporary files
-        segment_files = []  # Track intermediate video segments
+        Without an audio file the segments are only joined into a video-only file.
+        """
+        list_filename = os.path.splitext(os.path.basename(output_file))[0] + "-segments.txt"
+        list_path = os.path.join(self.config.temp_dir, list_filename)
+        with open(list_path, "w") as f:
+            for segment in segment_files:
+                f.write(f"file '{os.path.abspath(os.path.join(self.config.temp_dir, segment))}'\n")
+        
+        command = [self.file_utils.ffmpeg_binary(), "-y", "-loglevel", "error", "-f", "concat", "-safe", "0", "-i", list_path]
+        if audio_file:
+            command += ["-i", os.path.join(self.config.temp_dir, audio_file), "-map", "0:v:0", "-map", "1:a:0"]
+        else:
+            command += ["-map", "0:v:0"]
+        command += ["-c", "copy", "-movflags", "+faststart", output_file]
         
         try:
-            # Process script parts in batches to manage memory
+            subprocess.run(command, check=True)
+        finally:
+            self.file_utils.delete_temp_files([list_filename])
+        return output_file
+    
+    def write_srt(self, entries, srt_path):
+        """Write (start, end, text) entries in seconds as an SRT subtitle file"""
+        def format_time(seconds):
+            milliseconds = round(seconds * 1000)
+            hours, milliseconds = divmod(milliseconds, 3600000)
+            minutes, milliseconds = divmod(milliseconds, 60000)
+            seconds, milliseconds = divmod(milliseconds, 1000)
+            return f"{hours:02}:{minutes:02}:{seconds:02},{milliseconds:03}"
+        
+        with open(srt_path, "w", encoding="utf-8") as f:
+            for index, (start, end, text) in enumerate(entries, 1):
+                f.write(f"{index}\n{format_time(start)} --> {format_time(end)}\n{text}\n\n")
+        return srt_path
+    
+    def mux_variant(self, visual_file, audio_file, srt_file, output_file, language_code=None):
+        """Combine the cached visual track with an audio track and a subtitle stream.
+        
+        Video and audio are stream copied, only the subtitles are converted to mov_text.
+        """
+        command = [
+            self.file_utils.ffmpeg_binary(), "-y", "-loglevel", "error",
+            "-i", visual_file,
+            "-i", os.path.join(self.config.temp_dir, audio_file),
+            "-i", srt_file,
+            "-map", "0:v:0", "-map", "1:a:0", "-map", "2:s:0",
+            "-c:v", "copy", "-c:a", "copy", "-c:s", "mov_text"
+        ]
+        if language_code:
+            command += ["-metadata:s:a:0", f"language={language_code}", "-metadata:s:s:0", f"language={language_code}"]
+        command += ["-movflags", "+faststart", output_file]
+        subprocess.run(command, check=True)
+        return output_file
+    
+    async def render_variant(self, variant_dir, script_data, variant, prepared_parts=None):
+        """Render an audio and subtitle variant onto the visual track of variant_dir.
+        
+        Each part is narrated with the variant's voice and fitted to the part's slot in the
+        visual timeline. prepared_parts can pass TTS output that already exists for the voice.
+        Returns the output file or None.
+        """
+        with open(os.path.join(variant_dir, "timeline.json"), 'r') as f:
+            timeline = json.load(f)
+        durations = timeline["durations"]
+        name = variant["name"]
+        
+        temp_files = []
+        try:
+            audio_files = []
+            entries = []
+            slot_start = 0.0
             for i, part in enumerate(script_data["script"]):
-                all_created_clips = []  # Track clips just for this batch
-                
-                audioFile, subtitle_data = await self.tts_processor.convert_text_to_speech_and_vtt(part["text"], f"longVideoPart-{i}")
-                audioClip = AudioFileClip(os.path.join(self.config.temp_dir, audioFile))
-                all_created_clips.append(audioClip)
-                temp_files.append(audioFile)
-                
-                textClips = self.generate_text_clips(subtitle_data, 'bottom', 50)
-                all_created_clips.extend(textClips)
-                
-                videoUrls = self.video_downloader.get_video_urls(part["keyword"], "landscape", audioClip.duration)
+                if prepared_parts:
+                    audio_file, subtitle_data = prepared_parts[i]["audio_file"], prepared_parts[i]["subtitle_data"]
+                else:
+                    audio_file, subtitle_data = await self.synthesize(part["text"], f"variant-{name}-{i}", variant.get("voice"))
+                    temp_files.append(audio_file)
                 
-                videoClips = []
-                video_filenames = []
+                fitted_file, time_scale = self.audio_processor.fit_to_duration(audio_file, durations[i])
+                if fitted_file != audio_file:
+                    temp_files.append(fitted_file)
+                audio_files.append(fitted_file)
                 
-                for a, url in enumerate(videoUrls):
-                    fileName = self.video_downloader.download_video(url, f"pexelsClip-{i}-{a}")
-                    video_filenames.append(fileName)
-                    try:
-                        long_format = self.config.config["video"]["long_format"]
-                        video_clip = VideoFileClip(os.path.join(self.config.temp_dir, fileName), target_resolution=(long_format["width"], long_format["height"]))
-                        # Ensure video clip is long enough or loop it if needed
-                        if video_clip.duration < audioClip.duration / len(videoUrls):
-                            video_clip = video_clip.loop(duration=audioClip.duration / len(videoUrls))
-                        else:
-                            video_clip = video_clip.with_duration(audioClip.duration / len(videoUrls))
-                        videoClips.append(video_clip)
-                        all_created_clips.append(video_clip)
-                    except Exception as e:
-                        print(f"Error loading video clip {fileName}: {e}")
+                for start_time, end_time, text in subtitle_data:
+                    entries.append((
+                        slot_start + self.parse_timestamp(start_time) * time_scale,
+                        slot_start + self.parse_timestamp(end_time) * time_scale,
+                        text
+                    ))
+                slot_start += durations[i]
+            
+            track_file, _ = self.audio_processor.build_track(audio_files, f"variant-{name}-track", durations)
+            temp_files.append(track_file)
+            # The SRT is kept next to the output, players that ignore the subtitle stream need it as a sidecar
+            output_base = os.path.join(self.config.output_dir, f"{timeline['output_base']}-{name}")
+            srt_file = self.write_srt(entries, f"{output_base}.srt")
+            
+            output_file = f"{output_base}.mp4"
+            return self.mux_variant(os.path.join(variant_dir, "visual.mp4"), track_file, srt_file, output_file, variant.get("language_code"))
+        except Exception as e:
+            print(f"Error rendering variant {name}: {e}")
+            return None
+        finally:
+            self.file_utils.delete_temp_files(temp_files)
+    
+    async def generate_variants(self, script_data, video_type, variants, translate=None):
+        """Render the visual track of a script once and mux every voice/language variant onto it.
+        
+        The visual track is rendered without burned-in subtitles into a directory of its own
+        in temp_dir together with its timeline, and removed once every variant is muxed.
+        variants is a list of dicts with "name", "voice" and optionally "language" and
+        "language_code". translate(script_data, language) returns a translated script or
+        None. Returns a dict mapping variant names to output files, each with its subtitles
+        also written next to it as an .srt file.
+        """
+        layout = dict(self.get_layout(video_type), burn_subtitles=False)
+        variant_dir = os.path.join(self.config.temp_dir, f"variants-{video_type}-{int(time.time() * 1000)}")
+        os.makedirs(variant_dir, exist_ok=True)
+        asset_files = []  # Track TTS audio and downloaded clips
+        temp_files = []  # Track all other temporary files
+        segment_files = []  # Track intermediate video segments
+        
+        try:
+            parts = []
+            for i, part in enumerate(script_data["script"]):
+                prepared_part = await self.prepare_part(i, part, layout)
+                asset_files.append(prepared_part["audio_file"])
+                asset_files.extend(prepared_part["clip_files"])
+                parts.append(prepared_part)
+            
+            if not parts:
+                return {}
+            
+            # The default voice defines the timeline every variant is fitted to
+            track_file, offsets = self.audio_processor.build_track(
+                [prepared_part["audio_file"] for prepared_part in parts],
+                f"{layout['part_prefix']}-track"
+            )
+            temp_files.append(track_file)
+            durations = self.audio_processor.frame_aligned_durations(offsets, self.fps)
+            
+            for i, prepared_part in enumerate(parts):
+                segment_file = await self.run_render(self.render_segment, i, prepared_part, durations[i], layout)
+                if not segment_file:
+                    print(f"Aborting render, segment {i} could not be created")
+                    return {}
+                segment_files.append(segment_file)
+            
+            self.mux_segments(segment_files, None, os.path.join(variant_dir, "visual.mp4"))
+            with open(os.path.join(variant_dir, "timeline.json"), 'w') as f:
+                json.dump({
+                    "video_type": video_type,
+                    "output_base": os.path.splitext(layout["output_name"])[0],
+                    "durations": durations
+                }, f, indent=2)
+            
+            output_files = {}
+            default_variant = {"name": "default", "voice": self.config.tts_voice}
+            output_files["default"] = await self.render_variant(variant_dir, script_data, default_variant, parts)
+            
+            for variant in variants:
+                variant_script = script_data
+                if variant.get("language") and translate:
+                    variant_script = translate(script_data, variant["language"])
+                    if not variant_script or len(variant_script.get("script", [])) != len(script_data["script"]):
+                        print(f"Skipping variant {variant['name']}, translation failed")
                         continue
-                    
-                # Track all downloaded video files
-                temp_files.extend(video_filenames)
-                
-                if not videoClips:
-                    # Fallback if no videos were successfully loaded
-                    print(f"No valid video clips for part {i}, using a background video")
-                    background = VideoFileClip(self.file_utils.get_random_file()).with_duration(audioClip.duration)
-                    all_created_clips.append(background)
-                    videoClips = [background]
-                
-                # Create and save a segment for this part
-                try:
-                    concatenated_video = concatenate_videoclips(videoClips, method="compose")
-                    # Ensure the concatenated video is exactly the audio duration
-                    concatenated_video = concatenated_video.with_duration(audioClip.duration)
-                    long_format = self.config.config["video"]["long_format"]
-                    composite_clip = CompositeVideoClip([concatenated_video.resized(height=long_format["height"])] + textClips)
-                    composite_clip = composite_clip.with_duration(audioClip.duration).with_audio(audioClip)
-                    all_created_clips.append(composite_clip)
-                    
-                    # Save this segment to a temporary file
-                    segment_filename = f"long_segment_{i}.mp4"
-                    segment_path = os.path.join(self.config.temp_dir, segment_filename)
-                    composite_clip.write_videofile(
-                        filename=segment_path,
-                        threads=4,
-                        preset="ultrafast",
-                        temp_audiofile_path=self.config.temp_dir
-                    )
-                    segment_files.append(segment_filename)
-                except Exception as e:
-                    print(f"Error creating composite clip for part {i}: {e}")
-                    continue
-                finally:
-                    # Close all clips in this batch to release memory
-                    for clip in all_created_clips:
-                        try:
-                            clip.close()
-                        except Exception as e:
-                            print(f"Error closing clip: {e}")
+                output_files[variant["name"]] = await self.render_variant(variant_dir, variant_script, variant)
+            
+            return {name: output_file for name, output_file in output_files.items() if output_file}
+        finally:
+            # Delete temporary files
+            shutil.rmtree(variant_dir, ignore_errors=True)
+            self.file_utils.delete_temp_files(asset_files)
+            self.file_utils.delete_temp_files(temp_files)
+            self.file_utils.delete_temp_files(segment_files)
+    
+    def record_features(self, metrics, script_data, parts, layout, durations):
+        """Record the job inputs the cost model predicts stage durations from"""
+        video_seconds = sum(durations)
+        metrics.features.update({
+            "word_count": sum(len(part["text"].split()) for part in script_data["script"]),
+            "part_count": len(parts),
+            "clip_count": sum(len(prepared_part["clip_files"]) for prepared_part in parts),
+            "video_seconds": video_seconds,
+            "pixel_seconds": layout["format"]["width"] * layout["format"]["height"] / 1e6 * video_seconds
+        })
+    
+    async def generate_segmented_video(self, script_data, layout, prepared_parts=None, keep_assets=False, metrics=None):
+        """Render a multi-part script as video segments over a single assembled audio track.
+        
+        prepared_parts optionally maps part indexes to the result of prepare_part when the
+        assets were already produced, e.g. while the script was still streaming. With
+        keep_assets the TTS audio and clips are left in place for a later render. Stage
+        durations and input features are recorded on metrics when given.
+        """
+        prepared_parts = prepared_parts or {}
+        metrics = metrics or JobMetrics(None)
+        asset_files = []  # Track TTS audio and downloaded clips
+        temp_files = []  # Track all other temporary files
+        segment_files = []  # Track intermediate video segments
+        
+        if self.profiler:
+            self.profiler.start()
+        
+        try:
+            # Register already prepared assets first so they are cleaned up even on failure
+            for prepared_part in prepared_parts.values():
+                asset_files.append(prepared_part["audio_file"])
+                asset_files.extend(prepared_part["clip_files"])
             
-            # Combine all segments
-            if segment_files:
-                try:
-                    # Load segments as clips
-                    segment_clips = []
-                    for segment in segment_files:
-                        segment_path = os.path.join(self.config.temp_dir, segment)
-                        clip = VideoFileClip(segment_path)
-                        segment_clips.append(clip)
-                    
-                    finalVideo = concatenate_videoclips(segment_clips, method="compose")
-                    output_file = os.path.join(self.config.output_dir, "longVideo.mp4")
-                    finalVideo.write_videofile(
-                        filename=output_file,
-                        threads=4,
-                        preset="ultrafast",
-                        temp_audiofile_path=self.config.temp_dir                    
-                    )
-                    
-                    # Close the segment clips
-                    for clip in segment_clips:
-                        clip.close()
-                        
-                    return output_file
-                except Exception as e:
-                    print(f"Error rendering final long video: {e}")
+            async def prepare(i, part):
+                prepared_part = prepared_parts.get(i)
+                if prepared_part is None:
+                    prepared_part = await self.prepare_part(i, part, layout)
+                    asset_files.append(prepared_part["audio_file"])
+                    asset_files.extend(prepared_part["clip_files"])
+                return prepared_part
+            
+            with metrics.stage("prepare"), self.profile_stage("prepare"):
+                # Parts are prepared together, the concurrency controller paces the downloads
+                parts = await asyncio.gather(*[prepare(i, part) for i, part in enumerate(script_data["script"])], return_exceptions=True)
+                for result in parts:
+                    if isinstance(result, Exception):
+                        raise result
+            
+            if not parts:
+                return None
+            
+            # The assembled track's part offsets are the source of truth for the timeline
+            with metrics.stage("audio"), self.profile_stage("audio"):
+                track_file, offsets = await asyncio.to_thread(
+                    self.audio_processor.build_track,
+                    [prepared_part["audio_file"] for prepared_part in parts],
+                    f"{layout['part_prefix']}-track"
+                )
+            temp_files.append(track_file)
+            durations = self.audio_processor.frame_aligned_durations(offsets, self.fps)
+            
+            self.record_features(metrics, script_data, parts, layout, durations)
+            
+            with metrics.stage("render"):
+                # Segments render as concurrently as the memory budget allows
+                rendered = await asyncio.gather(
+                    *[self.run_render(self.render_segment, i, prepared_part, durations[i], layout) for i, prepared_part in enumerate(parts)],
+                    return_exceptions=True
+                )
+                segment_files.extend(result for result in rendered if isinstance(result, str))
+                for i, result in enumerate(rendered):
+                    if isinstance(result, Exception):
+                        raise result
+                    if not result:
+                        # A missing segment would shift every later part against the audio
+                        print(f"Aborting render, segment {i} could not be created")
+                        return None
+            
+            output_file = os.path.join(self.config.output_dir, layout["output_name"])
+            try:
+                with metrics.stage("mux"), self.profile_stage("mux"):
+                    return self.mux_segments(segment_files, track_file, output_file)
+            except Exception as e:
+                print(f"Error rendering final video: {e}")
+                return None
         finally:
+            if self.profiler:
+                self.profiler.stop()
+                self.profiler.report()
+            
             # Delete temporary files
+            if not keep_assets:
+                self.file_utils.delete_temp_files(asset_files)
             self.file_utils.delete_temp_files(temp_files)
             self.file_utils.delete_temp_files(segment_files)
 
+    async def generate_short_video(self, script, metrics=None):
+        script_data = self.file_utils.decode_json(script)
+        if not script_data:
+            return None, None
+        
+        output_file = await self.generate_segmented_video(script_data, self.get_layout("short"), metrics=metrics)
+        return output_file, script_data
+    
+    async def generate_long_video(self, script, prepared_parts=None, metrics=None):
+        script_data = self.file_utils.decode_json(script)
+        if not script_data:
+            return None
+        
+        return await self.generate_segmented_video(script_data, self.get_layout("long"), prepared_parts, metrics=metrics)
+
 
 class YouTubeUploader:
+    # Uploading captions needs youtube.force-ssl, tokens saved with fewer scopes are authorized again
+    SCOPES = ["https://www.googleapis.com/auth/youtube.upload", "https://www.googleapis.com/auth/youtube.force-ssl"]
+    
     def __init__(self, config_manager):
         self.config = config_manager
+        self.discovery_file = os.path.join(self.config.cache_dir, "youtube-v3-discovery.json")
+        self._youtube = None
+        self._youtube_creds = None
     
-    def upload_to_youtube(self, video_file, title, description):
-        SCOPES = ["https://www.googleapis.com/auth/youtube.upload"]
-        creds = None
+    def load_discovery_document(self):
+        """Return the YouTube v3 discovery document, cached on disk after the first use"""
+        if os.path.exists(self.discovery_file):
+            with open(self.discovery_file, 'r') as f:
+                return f.read()
+        
+        from googleapiclient.discovery_cache import get_static_doc
+        document = get_static_doc("youtube", "v3")
+        if document is None:
+            document = requests.get("https://www.googleapis.com/discovery/v1/apis/youtube/v3/rest").text
+        with open(self.discovery_file, 'w') as f:
+            f.write(document)
+        return document
+    
+    def get_service(self, creds):
+        """Build the YouTube client once per set of credentials"""
+        if self._youtube is None or self._youtube_creds is not creds:
+            from googleapiclient.discovery import build_from_document
+            self._youtube = build_from_document(self.load_discovery_document(), credentials=creds, developerKey=self.config.google_api_key)
+            self._youtube_creds = creds
+        return self._youtube
+    
+    def get_credentials(self):
+        """Return valid OAuth credentials, from token.pickle or a new authorization"""
+        from google_auth_oauthlib.flow import InstalledAppFlow
+        from google.auth.transport.requests import Request
+        
+        # Reuse the credentials of the previous upload while they are valid
+        creds = self._youtube_creds
 
-        if os.path.exists("token.pickle"):
+        if (not creds or not creds.valid) and os.path.exists("token.pickle"):
             with open("token.pickle", "rb") as token:
                 creds = pickle.load(token)
+        if creds and not creds.has_scopes(self.SCOPES):
+            creds = None
 
         if not creds or not creds.valid:
             if creds and creds.expired and creds.refresh_token:
                 creds.refresh(Request())
             else:
-                flow = InstalledAppFlow.from_client_secrets_file("client_secrets.json", SCOPES)
+                flow = InstalledAppFlow.from_client_secrets_file("client_secrets.json", self.SCOPES)
                 creds = flow.run_local_server(port=0)
 
             with open("token.pickle", "wb") as token:
                 pickle.dump(creds, token)
-
-        youtube = build("youtube", "v3", credentials=creds, developerKey=self.config.google_api_key)
+        return creds
+    
+    def upload_to_youtube(self, video_file, title, description):
+        """Upload a video, returns its YouTube video ID"""
+        from googleapiclient.http import MediaFileUpload
+        
+        youtube = self.get_service(self.get_credentials())
 
         # Append the default description to the generated description
         full_description = description
@@ -747,22 +2655,892 @@ class YouTubeUploader:
         )
         response = request.execute()
         print(f"Video uploaded to YouTube with ID: {response['id']}")
+        return response["id"]
+    
+    def upload_captions(self, video_id, srt_file, language, name=""):
+        """Add an SRT file as a caption track in language (a BCP-47 code) to an uploaded video"""
+        from googleapiclient.http import MediaFileUpload
+        
+        youtube = self.get_service(self.get_credentials())
+        response = youtube.captions().insert(
+            part="snippet",
+            body={"snippet": {"videoId": video_id, "language": language, "name": name, "isDraft": False}},
+            media_body=MediaFileUpload(srt_file, mimetype="application/octet-stream")
+        ).execute()
+        print(f"Captions ({language}) uploaded to video {video_id} with ID: {response['id']}")
+        return response["id"]
+
+
+class Prefetcher:
+    """Prepares validated scripts with their TTS audio and stock clips ahead of production"""
+    
+    SCRIPT_SETTINGS = {
+        "short": {"key": "fact", "max_tokens": 500},
+        "long": {"key": "topic", "max_tokens": 4096}
+    }
+    
+    def __init__(self, config_manager, content_tracker, text_generator, coordinator=None):
+        self.config = config_manager
+        self.content_tracker = content_tracker
+        self.text_generator = text_generator
+        self.coordinator = coordinator
+        self.file_utils = FileUtils(config_manager)
+        self.prefetch_dir = os.path.join(self.config.cache_dir, "prefetch")
+        self.normalize_clips = self.config.config.get("prefetch", {}).get("normalize_clips", True)
+        self.workspaces = WorkspaceManager(config_manager)
+        os.makedirs(self.prefetch_dir, exist_ok=True)
+    
+    def collect_garbage(self):
+        """Remove jobs left half built or claimed by processes that are no longer running"""
+        removed = 0
+        for name in os.listdir(self.prefetch_dir):
+            if not name.endswith((".building", ".claimed")):
+                continue
+            path = os.path.join(self.prefetch_dir, name)
+            owner = self.workspaces.abandoned_owner(path)
+            # Builds without an owner file predate owner tracking, a day without progress means they are dead
+            stale_build = (
+                name.endswith(".building")
+                and not os.path.exists(os.path.join(path, WorkspaceManager.OWNER_FILE))
+                and time.time() - os.path.getmtime(path) > 86400
+            )
+            if not owner and not stale_build:
+                continue
+            shutil.rmtree(path, ignore_errors=True)
+            removed += 1
+            print(f"Removed prefetched job {path} left by process {(owner or {}).get('pid', 'unknown')}")
+        return removed
+    
+    def get_prompt(self, video_type):
+        if video_type == "short":
+            return self.text_generator.get_short_video_prompt()
+        return self.text_generator.get_long_video_prompt()
+    
+    def pending_jobs(self, video_type=None):
+        """Return the manifests of unclaimed prefetched jobs, oldest first"""
+        manifests = []
+        for name in sorted(os.listdir(self.prefetch_dir)):
+            manifest_path = os.path.join(self.prefetch_dir, name, "manifest.json")
+            # Jobs still being built or already claimed by a renderer are not pending
+            if name.endswith((".building", ".claimed")) or not os.path.exists(manifest_path):
+                continue
+            try:
+                with open(manifest_path, 'r') as f:
+                    manifest = json.load(f)
+            except (OSError, json.JSONDecodeError) as e:
+                print(f"Error reading prefetched job {name}: {e}")
+                continue
+            if video_type is None or manifest["video_type"] == video_type:
+                manifest["job_dir"] = os.path.join(self.prefetch_dir, name)
+                manifests.append(manifest)
+        return manifests
+    
+    def validate_script(self, script_data, video_type):
+        """Check that a generated script is complete and not already used or prefetched"""
+        key = self.SCRIPT_SETTINGS[video_type]["key"]
+        if not isinstance(script_data, dict) or not script_data.get(key):
+            return False
+        
+        parts = script_data.get("script")
+        if not isinstance(parts, list) or not parts:
+            return False
+        for part in parts:
+            if not isinstance(part, dict) or not part.get("text") or not isinstance(part.get("keyword"), list):
+                return False
+        
+        used = self.content_tracker.chosen_facts if video_type == "short" else self.content_tracker.chosen_topics
+        pending = [manifest["script_data"][key] for manifest in self.pending_jobs(video_type)]
+        if script_data[key] in used or script_data[key] in pending:
+            print(f"Skipping already used {key}: {script_data[key]}")
+            return False
+        return True
+    
+    def normalize_clip(self, clip_path, video_format, video_type=None):
+        """Re-encode a stock clip to the output size and fps so the render decodes it cheaply"""
+        width, height = video_format["width"], video_format["height"]
+        fps = self.config.config["video"].get("fps", 30)
+        normalized_path = clip_path + ".normalized.mp4"
+        # The clip is decoded again by the render, so it uses the host's intermediate profile
+        profile = EncoderProfiles(self.config).get(video_type, "intermediate") or {"preset": "veryfast", "crf": 18, "threads": 0}
+        try:
+            subprocess.run(
+                [
+                    self.file_utils.ffmpeg_binary(), "-y", "-loglevel", "error", "-i", clip_path,
+                    "-vf", f"scale={width}:{height}:force_original_aspect_ratio=increase,crop={width}:{height},fps={fps}",
+                    "-an", "-c:v", "libx264", "-preset", profile["preset"], "-crf", str(profile["crf"]),
+                    "-threads", str(profile["threads"]), normalized_path
+                ],
+                check=True
+            )
+            os.replace(normalized_path, clip_path)
+        except Exception as e:
+            print(f"Error normalizing clip {clip_path}: {e}")
+            if os.path.exists(normalized_path):
+                os.remove(normalized_path)
+    
+    async def prefetch_job(self, video_type="long", attempts=3):
+        """Generate, validate and prepare one job, returns its directory or None"""
+        settings = self.SCRIPT_SETTINGS[video_type]
+        script_data = None
+        for attempt in range(attempts):
+            script = await asyncio.to_thread(self.text_generator.generate_text, self.get_prompt(video_type), max_tokens=settings["max_tokens"])
+            script_data = self.file_utils.decode_json(script)
+            if self.validate_script(script_data, video_type):
+                break
+            print(f"Prefetched {video_type} script rejected ({attempt + 1}/{attempts})")
+            script_data = None
+        
+        if not script_data:
+            return None
+        
+        # Jobs are prepared under a temporary name and only become visible once complete
+        job_name = f"{video_type}-{int(time.time() * 1000)}"
+        building_dir = os.path.join(self.prefetch_dir, job_name + ".building")
+        job_config = self.config.with_temp_dir(building_dir)
+        self.workspaces.write_owner(building_dir)
+        video_processor = VideoProcessor(job_config)
+        layout = video_processor.get_layout(video_type)
+        
+        try:
+            prepared_parts = {}
+            for i, part in enumerate(script_data["script"]):
+                prepared_part = await video_processor.prepare_part(i, part, layout, PexelsRateLimiter.PRIORITY_PREFETCH + i)
+                if self.normalize_clips:
+                    for clip_file in prepared_part["clip_files"]:
+                        await asyncio.to_thread(self.normalize_clip, os.path.join(building_dir, clip_file), layout["format"], layout["video_type"])
+                prepared_parts[i] = prepared_part
+            
+            with open(os.path.join(building_dir, "manifest.json"), 'w') as f:
+                json.dump({
+                    "video_type": video_type,
+                    "created": time.time(),
+                    "script_data": script_data,
+                    "parts": prepared_parts
+                }, f, indent=2)
+            
+            # Finished jobs belong to no process until they are claimed
+            os.remove(os.path.join(building_dir, WorkspaceManager.OWNER_FILE))
+            job_dir = os.path.join(self.prefetch_dir, job_name)
+            os.rename(building_dir, job_dir)
+            print(f"Prefetched {video_type} job: {job_dir}")
+            return job_dir
+        except Exception as e:
+            print(f"Error prefetching {video_type} job: {e}")
+            shutil.rmtree(building_dir, ignore_errors=True)
+            return None
+    
+    async def prefetch(self, video_type="long", count=1):
+        """Prepare jobs until count unclaimed jobs of this type are waiting"""
+        jobs = []
+        while len(self.pending_jobs(video_type)) < count:
+            job_dir = await self.prefetch_job(video_type)
+            if not job_dir:
+                break
+            jobs.append(job_dir)
+        return jobs
+    
+    async def render_draft(self, video_type):
+        """Render a low-resolution draft of the next prefetched job without consuming it.
+        
+        A job is prefetched first when none is waiting. The final render later reuses the
+        same TTS audio, clips and subtitles.
+        """
+        manifests = self.pending_jobs(video_type)
+        if not manifests:
+            if not await self.prefetch_job(video_type):
+                return None
+            manifests = self.pending_jobs(video_type)
+        manifest = manifests[0]
+        
+        print(f"Rendering draft of prefetched {video_type} job: {manifest['job_dir']}")
+        video_processor = VideoProcessor(self.config.with_temp_dir(manifest["job_dir"]), draft=True)
+        prepared_parts = {int(i): part for i, part in manifest["parts"].items()}
+        output_file = await video_processor.generate_segmented_video(
+            manifest["script_data"],
+            video_processor.get_layout(video_type),
+            prepared_parts,
+            keep_assets=True
+        )
+        if output_file:
+            print(f"Draft ready: {output_file}")
+        return output_file
+    
+    def claim_job(self, video_type):
+        """Atomically claim the oldest prefetched job, returns its manifest or None"""
+        for manifest in self.pending_jobs(video_type):
+            claimed_dir = manifest["job_dir"] + ".claimed"
+            try:
+                os.rename(manifest["job_dir"], claimed_dir)
+            except OSError:
+                # Another process claimed it first
+                continue
+            self.workspaces.write_owner(claimed_dir)
+            manifest["job_dir"] = claimed_dir
+            return manifest
+        return None
+    
+    async def render_next_job(self, video_type, output_dir=None, metrics=None):
+        """Render the oldest prefetched job, returns (output_file, script_data) or (None, None)"""
+        manifest = self.claim_job(video_type)
+        if not manifest:
+            return None, None
+        
+        print(f"Rendering prefetched {video_type} job: {manifest['job_dir']}")
+        try:
+            prepared_parts = {int(i): part for i, part in manifest["parts"].items()}
+            if self.coordinator:
+                output_file = await self.coordinator.render(
+                    manifest["script_data"], video_type, prepared_parts, manifest["job_dir"], metrics, output_dir
+                )
+                return output_file, manifest["script_data"]
+            
+            job_config = self.config.with_temp_dir(manifest["job_dir"])
+            job_config.output_dir = output_dir or job_config.output_dir
+            video_processor = VideoProcessor(job_config)
+            output_file = await video_processor.generate_segmented_video(
+                manifest["script_data"],
+                video_processor.get_layout(video_type),
+                prepared_parts,
+                metrics=metrics
+            )
+            return output_file, manifest["script_data"]
+        finally:
+            shutil.rmtree(manifest["job_dir"], ignore_errors=True)
+
+
+class SQLiteTaskQueue:
+    """Segment task queue stored in a SQLite database, for local and single-host use"""
+    
+    def __init__(self, path, max_attempts=3):
+        self.path = path
+        self.max_attempts = max_attempts
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        conn = self._connect()
+        try:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS tasks (
+                    task_id TEXT PRIMARY KEY,
+                    job_id TEXT NOT NULL,
+                    payload TEXT NOT NULL,
+                    status TEXT NOT NULL DEFAULT 'pending',
+                    worker_id TEXT,
+                    lease_until REAL,
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    result TEXT,
+                    error TEXT,
+                    created REAL NOT NULL
+                )
+            """)
+        finally:
+            conn.close()
+    
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        return conn
+    
+    def _execute(self, query, params=()):
+        conn = self._connect()
+        try:
+            return conn.execute(query, params).rowcount
+        finally:
+            conn.close()
+    
+    def _task(self, row):
+        task = dict(row)
+        task["payload"] = json.loads(task["payload"])
+        return task
+    
+    def enqueue(self, job_id, task_id, payload):
+        """Add a task, enqueueing the same task_id twice has no effect"""
+        return self._execute(
+            "INSERT OR IGNORE INTO tasks (task_id, job_id, payload, created) VALUES (?, ?, ?, ?)",
+            (task_id, job_id, json.dumps(payload), time.time())
+        ) == 1
+    
+    def claim(self, worker_id, lease_seconds):
+        """Atomically claim the oldest pending task, returns it or None"""
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute("SELECT * FROM tasks WHERE status = 'pending' ORDER BY created, task_id LIMIT 1").fetchone()
+            if row is None:
+                conn.execute("COMMIT")
+                return None
+            conn.execute(
+                "UPDATE tasks SET status = 'claimed', worker_id = ?, lease_until = ?, attempts = attempts + 1 WHERE task_id = ?",
+                (worker_id, time.time() + lease_seconds, row["task_id"])
+            )
+            # Return the claimed state, like the redis backend does
+            row = conn.execute("SELECT * FROM tasks WHERE task_id = ?", (row["task_id"],)).fetchone()
+            conn.execute("COMMIT")
+            return self._task(row)
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+    
+    def heartbeat(self, task_id, worker_id, lease_seconds):
+        """Extend the lease of a claimed task, returns False when the claim was lost"""
+        return self._execute(
+            "UPDATE tasks SET lease_until = ? WHERE task_id = ? AND worker_id = ? AND status = 'claimed'",
+            (time.time() + lease_seconds, task_id, worker_id)
+        ) == 1
+    
+    def complete(self, task_id, worker_id, result):
+        """Mark a task done unless another worker holds it now, returns whether it was accepted"""
+        return self._execute(
+            "UPDATE tasks SET status = 'done', result = ?, lease_until = NULL "
+            "WHERE task_id = ? AND (status = 'pending' OR (status = 'claimed' AND worker_id = ?))",
+            (json.dumps(result), task_id, worker_id)
+        ) == 1
+    
+    def fail(self, task_id, worker_id, error):
+        """Release a claimed task for another attempt, or mark it failed after max_attempts"""
+        return self._execute(
+            "UPDATE tasks SET status = CASE WHEN attempts >= ? THEN 'failed' ELSE 'pending' END, "
+            "worker_id = NULL, lease_until = NULL, error = ? "
+            "WHERE task_id = ? AND worker_id = ? AND status = 'claimed'",
+            (self.max_attempts, str(error), task_id, worker_id)
+        ) == 1
+    
+    def requeue_expired(self):
+        """Release tasks whose worker stopped renewing its lease, returns how many"""
+        return self._execute(
+            "UPDATE tasks SET status = CASE WHEN attempts >= ? THEN 'failed' ELSE 'pending' END, "
+            "worker_id = NULL, lease_until = NULL, error = 'lease expired' "
+            "WHERE status = 'claimed' AND lease_until < ?",
+            (self.max_attempts, time.time())
+        )
+    
+    def job_tasks(self, job_id):
+        """Return every task of a job"""
+        conn = self._connect()
+        try:
+            rows = conn.execute("SELECT * FROM tasks WHERE job_id = ? ORDER BY task_id", (job_id,)).fetchall()
+            tasks = [self._task(row) for row in rows]
+        finally:
+            conn.close()
+        for task in tasks:
+            task["result"] = json.loads(task["result"]) if task["result"] else None
+        return tasks
+    
+    def delete_job(self, job_id):
+        self._execute("DELETE FROM tasks WHERE job_id = ?", (job_id,))
+
+
+class RedisTaskQueue:
+    """Segment task queue on a Redis-compatible server, shared by workers on several hosts.
+    
+    Every state change runs as a Lua script so claims stay atomic across workers. Scripts
+    only touch the keys they declare, and all keys share the {prefix} hash tag, so the
+    queue also runs on Redis Cluster and servers that enforce declared keys.
+    """
+    
+    ENQUEUE = """
+    if redis.call('EXISTS', KEYS[1]) == 1 then return 0 end
+    redis.call('HSET', KEYS[1], 'task_id', ARGV[1], 'job_id', ARGV[2], 'payload', ARGV[3],
+        'status', 'pending', 'worker_id', '', 'attempts', 0, 'created', ARGV[4])
+    redis.call('ZADD', KEYS[2], ARGV[4], ARGV[1])
+    redis.call('SADD', KEYS[3], ARGV[1])
+    return 1
+    """
+    CLAIM = """
+    if redis.call('ZREM', KEYS[2], ARGV[3]) == 0 or redis.call('HGET', KEYS[1], 'status') ~= 'pending' then return 0 end
+    redis.call('HSET', KEYS[1], 'status', 'claimed', 'worker_id', ARGV[1], 'lease_until', ARGV[2])
+    redis.call('HINCRBY', KEYS[1], 'attempts', 1)
+    redis.call('ZADD', KEYS[3], ARGV[2], ARGV[3])
+    return 1
+    """
+    HEARTBEAT = """
+    if redis.call('HGET', KEYS[1], 'status') ~= 'claimed' or redis.call('HGET', KEYS[1], 'worker_id') ~= ARGV[1] then return 0 end
+    redis.call('HSET', KEYS[1], 'lease_until', ARGV[2])
+    redis.call('ZADD', KEYS[2], ARGV[2], ARGV[3])
+    return 1
+    """
+    COMPLETE = """
+    local status = redis.call('HGET', KEYS[1], 'status')
+    if not (status == 'pending' or (status == 'claimed' and redis.call('HGET', KEYS[1], 'worker_id') == ARGV[1])) then return 0 end
+    redis.call('HSET', KEYS[1], 'status', 'done', 'result', ARGV[2])
+    redis.call('ZREM', KEYS[2], ARGV[3])
+    redis.call('ZREM', KEYS[3], ARGV[3])
+    return 1
+    """
+    RELEASE = """
+    if redis.call('HGET', KEYS[1], 'status') ~= 'claimed' then return 0 end
+    if ARGV[1] ~= '' and redis.call('HGET', KEYS[1], 'worker_id') ~= ARGV[1] then return 0 end
+    if ARGV[1] == '' and tonumber(redis.call('HGET', KEYS[1], 'lease_until')) >= tonumber(ARGV[4]) then return 0 end
+    redis.call('ZREM', KEYS[2], ARGV[3])
+    redis.call('HSET', KEYS[1], 'worker_id', '', 'error', ARGV[2])
+    if tonumber(redis.call('HGET', KEYS[1], 'attempts')) >= tonumber(ARGV[5]) then
+        redis.call('HSET', KEYS[1], 'status', 'failed')
+    else
+        redis.call('HSET', KEYS[1], 'status', 'pending')
+        redis.call('ZADD', KEYS[3], redis.call('HGET', KEYS[1], 'created'), ARGV[3])
+    end
+    return 1
+    """
+    
+    # Pending tasks read per claim round, other workers may win the oldest ones
+    CLAIM_CANDIDATES = 10
+    
+    def __init__(self, url, prefix="shortsgenerator", max_attempts=3):
+        try:
+            import redis
+        except ImportError:
+            raise RuntimeError("The redis task queue backend needs the redis package: pip install redis")
+        self.redis = redis.Redis.from_url(url, decode_responses=True)
+        # The hash tag keeps every key of the queue in one cluster slot
+        self.prefix = f"{{{prefix}}}"
+        self.max_attempts = max_attempts
+        self.pending_key = f"{self.prefix}:pending"
+        self.claimed_key = f"{self.prefix}:claimed"
+        self._enqueue = self.redis.register_script(self.ENQUEUE)
+        self._claim = self.redis.register_script(self.CLAIM)
+        self._heartbeat = self.redis.register_script(self.HEARTBEAT)
+        self._complete = self.redis.register_script(self.COMPLETE)
+        self._release = self.redis.register_script(self.RELEASE)
+    
+    def _task_key(self, task_id):
+        return f"{self.prefix}:task:{task_id}"
+    
+    def _job_key(self, job_id):
+        return f"{self.prefix}:job:{job_id}"
+    
+    def _task(self, task_id):
+        task = self.redis.hgetall(self._task_key(task_id))
+        if not task:
+            return None
+        task["payload"] = json.loads(task["payload"])
+        task["attempts"] = int(task["attempts"])
+        task["result"] = json.loads(task["result"]) if task.get("result") else None
+        return task
+    
+    def enqueue(self, job_id, task_id, payload):
+        return self._enqueue(
+            keys=[self._task_key(task_id), self.pending_key, self._job_key(job_id)],
+            args=[task_id, job_id, json.dumps(payload), time.time()]
+        ) == 1
+    
+    def claim(self, worker_id, lease_seconds):
+        """Claim the oldest pending task, returns it or None"""
+        while True:
+            # Pending tasks are ordered by creation time, then task_id, like the SQLite backend
+            candidates = self.redis.zrange(self.pending_key, 0, self.CLAIM_CANDIDATES - 1)
+            if not candidates:
+                return None
+            for task_id in candidates:
+                if self._claim(keys=[self._task_key(task_id), self.pending_key, self.claimed_key], args=[worker_id, time.time() + lease_seconds, task_id]) == 1:
+                    return self._task(task_id)
+    
+    def heartbeat(self, task_id, worker_id, lease_seconds):
+        return self._heartbeat(keys=[self._task_key(task_id), self.claimed_key], args=[worker_id, time.time() + lease_seconds, task_id]) == 1
+    
+    def complete(self, task_id, worker_id, result):
+        return self._complete(keys=[self._task_key(task_id), self.claimed_key, self.pending_key], args=[worker_id, json.dumps(result), task_id]) == 1
+    
+    def fail(self, task_id, worker_id, error):
+        return self._release(
+            keys=[self._task_key(task_id), self.claimed_key, self.pending_key],
+            args=[worker_id, str(error), task_id, time.time(), self.max_attempts]
+        ) == 1
+    
+    def requeue_expired(self):
+        now = time.time()
+        requeued = 0
+        for task_id in self.redis.zrangebyscore(self.claimed_key, "-inf", now):
+            requeued += self._release(
+                keys=[self._task_key(task_id), self.claimed_key, self.pending_key],
+                args=["", "lease expired", task_id, now, self.max_attempts]
+            )
+        return requeued
+    
+    def job_tasks(self, job_id):
+        tasks = [self._task(task_id) for task_id in sorted(self.redis.smembers(self._job_key(job_id)))]
+        return [task for task in tasks if task]
+    
+    def delete_job(self, job_id):
+        for task_id in self.redis.smembers(self._job_key(job_id)):
+            self.redis.zrem(self.pending_key, task_id)
+            self.redis.zrem(self.claimed_key, task_id)
+            self.redis.delete(self._task_key(task_id))
+        self.redis.delete(self._job_key(job_id))
+
+
+def get_task_queue(config_manager):
+    """Create the segment task queue configured under "distributed" in config.json"""
+    distributed_config = config_manager.config.get("distributed", {})
+    backend = distributed_config.get("backend", "sqlite")
+    max_attempts = distributed_config.get("max_attempts", 3)
+    if backend == "redis":
+        return RedisTaskQueue(distributed_config.get("redis_url", "redis://localhost:6379/0"), max_attempts=max_attempts)
+    if backend == "sqlite":
+        return SQLiteTaskQueue(distributed_config.get("sqlite_path", os.path.join(config_manager.cache_dir, "tasks.db")), max_attempts)
+    raise ValueError(f"Unknown task queue backend: {backend}")
+
+
+class RenderCoordinator:
+    """Splits a job into segment tasks for remote workers and assembles their results.
+    
+    Assets and segments live in a per-job directory under distributed.shared_dir, which
+    must be mounted at the same path on every worker.
+    """
+    
+    def __init__(self, config_manager, task_queue):
+        self.config = config_manager
+        self.task_queue = task_queue
+        distributed_config = self.config.config.get("distributed", {})
+        self.shared_dir = distributed_config.get("shared_dir", "./shared")
+        self.poll_interval = distributed_config.get("poll_interval", 2)
+    
+    async def render(self, script_data, video_type, prepared_parts=None, source_dir=None, metrics=None, output_dir=None):
+        """Render a script on the workers, returns the output file or None.
+        
+        prepared_parts from prepare_part are moved from source_dir into the job directory.
+        Stage durations and input features are recorded on metrics when given, the render
+        stage covers the wait for the workers. The output goes to output_dir, or the
+        configured output directory.
+        """
+        metrics = metrics or JobMetrics(None)
+        job_id = f"{video_type}-{int(time.time() * 1000)}-{os.getpid()}"
+        job_dir = os.path.abspath(os.path.join(self.shared_dir, job_id))
+        job_config = self.config.with_temp_dir(job_dir)
+        video_processor = VideoProcessor(job_config)
+        layout = video_processor.get_layout(video_type)
+        prepared_parts = prepared_parts or {}
+        
+        try:
+            parts = []
+            with metrics.stage("prepare"):
+                for i, part in enumerate(script_data["script"]):
+                    prepared_part = prepared_parts.get(i)
+                    if prepared_part is not None and source_dir:
+                        for name in [prepared_part["audio_file"]] + prepared_part["clip_files"]:
+                            shutil.move(os.path.join(source_dir, name), os.path.join(job_dir, name))
+                    elif prepared_part is None:
+                        prepared_part = await video_processor.prepare_part(i, part, layout)
+                    parts.append(prepared_part)
+            
+            if not parts:
+                return None
+            
+            with metrics.stage("audio"):
+                track_file, offsets = await asyncio.to_thread(
+                    video_processor.audio_processor.build_track,
+                    [prepared_part["audio_file"] for prepared_part in parts],
+                    f"{layout['part_prefix']}-track"
+                )
+            durations = video_processor.audio_processor.frame_aligned_durations(offsets, video_processor.fps)
+            video_processor.record_features(metrics, script_data, parts, layout, durations)
+            
+            for i, prepared_part in enumerate(parts):
+                self.task_queue.enqueue(job_id, f"{job_id}:{i:04d}", {
+                    "job_dir": job_dir,
+                    "index": i,
+                    "prepared_part": prepared_part,
+                    "duration": durations[i],
+                    "layout": layout
+                })
+            print(f"Queued {len(parts)} segment tasks for job {job_id}")
+            
+            with metrics.stage("render"):
+                segment_files = await self.wait_for_segments(job_id)
+            if not segment_files:
+                return None
+            
+            output_file = os.path.join(output_dir or self.config.output_dir, layout["output_name"])
+            with metrics.stage("mux"):
+                return video_processor.mux_segments(segment_files, track_file, output_file)
+        except Exception as e:
+            print(f"Error rendering distributed job {job_id}: {e}")
+            return None
+        finally:
+            self.task_queue.delete_job(job_id)
+            shutil.rmtree(job_dir, ignore_errors=True)
+    
+    async def wait_for_segments(self, job_id):
+        """Wait until every task of the job is done, returns segment filenames in order or None"""
+        while True:
+            # Any node may recover tasks from dead workers, the coordinator does it while waiting
+            self.task_queue.requeue_expired()
+            tasks = self.task_queue.job_tasks(job_id)
+            failed = [task for task in tasks if task["status"] == "failed"]
+            if failed:
+                print(f"Job {job_id} failed, segment task {failed[0]['task_id']}: {failed[0].get('error')}")
+                return None
+            if tasks and all(task["status"] == "done" for task in tasks):
+                tasks.sort(key=lambda task: task["payload"]["index"])
+                return [task["result"] for task in tasks]
+            await asyncio.sleep(self.poll_interval)
+
+
+class RenderWorker:
+    """Claims segment tasks from the queue and renders them into the job's shared directory"""
+    
+    def __init__(self, config_manager, task_queue, worker_id=None):
+        self.config = config_manager
+        self.task_queue = task_queue
+        self.worker_id = worker_id or f"{socket.gethostname()}-{os.getpid()}"
+        distributed_config = self.config.config.get("distributed", {})
+        self.lease_seconds = distributed_config.get("lease_seconds", 300)
+        self.poll_interval = distributed_config.get("poll_interval", 2)
+    
+    def _keep_lease(self, task_id, stop_event):
+        while not stop_event.wait(self.lease_seconds / 3):
+            if not self.task_queue.heartbeat(task_id, self.worker_id, self.lease_seconds):
+                print(f"Lost the claim on task {task_id}")
+                return
+    
+    def process_task(self, task):
+        payload = task["payload"]
+        video_processor = VideoProcessor(self.config.with_temp_dir(payload["job_dir"]))
+        layout = payload["layout"]
+        i = payload["index"]
+        segment_filename = f"{layout['segment_prefix']}_{i}.mp4"
+        # Render under a worker specific name and move it into place atomically, so a
+        # task rendered twice after a requeue never leaves a half written segment
+        partial_filename = f"{layout['segment_prefix']}_{i}.{self.worker_id}.mp4"
+        
+        stop_event = threading.Event()
+        heartbeat = threading.Thread(target=self._keep_lease, args=(task["task_id"], stop_event), daemon=True)
+        heartbeat.start()
+        try:
+            rendered = video_processor.render_segment(i, payload["prepared_part"], payload["duration"], layout, partial_filename)
+        finally:
+            stop_event.set()
+            heartbeat.join()
+        
+        if not rendered:
+            self.task_queue.fail(task["task_id"], self.worker_id, "segment render failed")
+            return False
+        
+        os.replace(os.path.join(payload["job_dir"], partial_filename), os.path.join(payload["job_dir"], segment_filename))
+        if not self.task_queue.complete(task["task_id"], self.worker_id, segment_filename):
+            print(f"Task {task['task_id']} was already completed or reassigned")
+        return True
+    
+    def run(self, once=False):
+        """Process tasks until interrupted, or until the queue is empty when once is set"""
+        print(f"Render worker {self.worker_id} started")
+        while True:
+            self.task_queue.requeue_expired()
+            task = self.task_queue.claim(self.worker_id, self.lease_seconds)
+            if task is None:
+                if once:
+                    return
+                time.sleep(self.poll_interval)
+                continue
+            
+            print(f"Rendering task {task['task_id']}")
+            try:
+                self.process_task(task)
+            except Exception as e:
+                print(f"Error processing task {task['task_id']}: {e}")
+                self.task_queue.fail(task["task_id"], self.worker_id, e)
+
+
+class JobMetrics:
+    """Wall-clock duration of each pipeline stage of one job and the features of its input"""
+    
+    def __init__(self, video_type):
+        self.video_type = video_type
+        self.features = {}
+        self.stages = {}
+    
+    @contextlib.contextmanager
+    def stage(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.stages[name] = self.stages.get(name, 0.0) + time.perf_counter() - start
+    
+    def save(self, history_file):
+        """Append this job to the history the cost model is fitted on"""
+        os.makedirs(os.path.dirname(os.path.abspath(history_file)), exist_ok=True)
+        with open(history_file, 'a') as f:
+            f.write(json.dumps({
+                "time": time.time(),
+                "video_type": self.video_type,
+                "features": self.features,
+                "stages": self.stages
+            }) + "\n")
+
+
+class CostModel:
+    """Predicts per-stage durations from the job history with a ridge regression per stage"""
+    
+    FEATURES = ["word_count", "part_count", "clip_count", "video_seconds", "pixel_seconds"]
+    # Used until the history has a job of the requested type
+    DEFAULT_DURATIONS = {"short": 300.0, "long": 1800.0}
+    
+    def __init__(self, history_file):
+        self.history = []
+        if os.path.exists(history_file):
+            with open(history_file, 'r') as f:
+                for line in f:
+                    try:
+                        self.history.append(json.loads(line))
+                    except json.JSONDecodeError:
+                        continue
+        self.coefficients = self.fit()
+    
+    def _vector(self, video_type, features):
+        return [1.0, 1.0 if video_type == "long" else 0.0] + [float(features.get(name, 0)) for name in self.FEATURES]
+    
+    def fit(self):
+        """Fit one linear model per stage, returns a dict of coefficient lists"""
+        import numpy as np
+        
+        coefficients = {}
+        stages = {stage for job in self.history for stage in job["stages"]}
+        for stage in stages:
+            jobs = [job for job in self.history if stage in job["stages"]]
+            x = np.array([self._vector(job["video_type"], job["features"]) for job in jobs])
+            y = np.array([job["stages"][stage] for job in jobs])
+            # Scale columns so the ridge penalty treats features alike
+            scale = np.maximum(np.abs(x).max(axis=0), 1e-9)
+            xs = x / scale
+            beta = np.linalg.solve(xs.T @ xs + 1e-2 * np.eye(xs.shape[1]), xs.T @ y)
+            coefficients[stage] = [float(value) for value in beta / scale]
+        return coefficients
+    
+    def expected_features(self, video_type):
+        """Average features of past jobs of this type, for jobs whose script does not exist yet"""
+        jobs = [job for job in self.history if job["video_type"] == video_type]
+        if not jobs:
+            return {}
+        return {name: sum(job["features"].get(name, 0) for job in jobs) / len(jobs) for name in self.FEATURES}
+    
+    def predict(self, video_type, features=None):
+        """Return the predicted seconds of every stage"""
+        if not any(job["video_type"] == video_type for job in self.history):
+            return {"total": self.DEFAULT_DURATIONS.get(video_type, 1800.0)}
+        
+        features = features or self.expected_features(video_type)
+        vector = self._vector(video_type, features)
+        return {
+            stage: max(sum(c * v for c, v in zip(beta, vector)), 0.0)
+            for stage, beta in self.coefficients.items()
+        }
+    
+    def predict_total(self, video_type, features=None):
+        return sum(self.predict(video_type, features).values())
+
+
+class JobScheduler:
+    """Orders queued jobs by deadline slack and runs as many in parallel as needed to meet them.
+    
+    Jobs are read from the scheduler jobs file, a JSON list of {"type": "short"|"long",
+    "deadline": ISO 8601 time}. Jobs that finish are removed from the file.
+    """
+    
+    def __init__(self, generator):
+        self.generator = generator
+        scheduler_config = generator.config_manager.config.get("scheduler", {})
+        self.jobs_file = scheduler_config.get("jobs_file", "./schedule.json")
+        self.max_parallel = scheduler_config.get("max_parallel", 2)
+        # Fraction by which every extra concurrent job slows the others down
+        self.parallel_slowdown = scheduler_config.get("parallel_slowdown", 0.6)
+        self.cost_model = CostModel(generator.history_file)
+    
+    def load_jobs(self):
+        if not os.path.exists(self.jobs_file):
+            return []
+        with open(self.jobs_file, 'r') as f:
+            jobs = json.load(f)
+        for index, job in enumerate(jobs):
+            job.setdefault("id", f"{job['type']}-{index}-{int(time.time())}")
+            job["deadline_time"] = datetime.fromisoformat(job["deadline"]).timestamp()
+            job["predicted"] = self.cost_model.predict_total(job["type"])
+        return jobs
+    
+    def save_jobs(self, jobs):
+        with open(self.jobs_file, 'w') as f:
+            json.dump([{"id": job["id"], "type": job["type"], "deadline": job["deadline"]} for job in jobs], f, indent=2)
+    
+    def simulate(self, jobs, slots, now):
+        """Return the predicted finish time of each job when run in order on slots workers"""
+        slowdown = 1 + self.parallel_slowdown * (slots - 1)
+        free_at = [now] * slots
+        finish_times = []
+        for job in jobs:
+            slot = free_at.index(min(free_at))
+            free_at[slot] += job["predicted"] * slowdown
+            finish_times.append(free_at[slot])
+        return finish_times
+    
+    def plan(self, jobs, now=None):
+        """Order jobs by least slack and pick the smallest parallelism that meets every deadline"""
+        now = now or time.time()
+        ordered = sorted(jobs, key=lambda job: job["deadline_time"] - job["predicted"])
+        
+        best_slots, best_late = 1, None
+        for slots in range(1, self.max_parallel + 1):
+            finish_times = self.simulate(ordered, slots, now)
+            late = sum(1 for job, finish in zip(ordered, finish_times) if finish > job["deadline_time"])
+            if best_late is None or late < best_late:
+                best_slots, best_late = slots, late
+            if late == 0:
+                break
+        
+        for job, finish in zip(ordered, self.simulate(ordered, best_slots, now)):
+            if finish > job["deadline_time"]:
+                print(f"Job {job['id']} is predicted to miss its deadline by {finish - job['deadline_time']:.0f}s")
+        return ordered, best_slots
+    
+    async def run(self):
+        jobs = self.load_jobs()
+        if not jobs:
+            print("No scheduled jobs")
+            return
+        
+        ordered, slots = self.plan(jobs)
+        print(f"Running {len(ordered)} jobs with {slots} in parallel")
+        remaining = list(ordered)
+        semaphore = asyncio.Semaphore(slots)
+        
+        async def run_job(job):
+            async with semaphore:
+                print(f"Starting job {job['id']} ({job['type']}, predicted {job['predicted']:.0f}s)")
+                if await self.generator.run_job(job["type"], job["id"]):
+                    remaining.remove(job)
+                    self.save_jobs(remaining)
+        
+        await asyncio.gather(*[run_job(job) for job in ordered])
 
 
 class ShortsGenerator:
-    def __init__(self):
+    def __init__(self, update_last_video_type=True, profile=False):
         self.config_manager = ConfigManager()
-        self.content_tracker = ChosenContentTracker()
+        if profile:
+            self.config_manager.config.setdefault("profiling", {})["enabled"] = True
+        self.content_tracker = ChosenContentTracker(update_last_video_type)
         self.text_generator = TextGenerator(self.config_manager, self.content_tracker)
-        self.video_processor = VideoProcessor(self.config_manager)
         self.youtube_uploader = YouTubeUploader(self.config_manager)
         self.file_utils = FileUtils(self.config_manager)
+        self.coordinator = None
+        if self.config_manager.config.get("distributed", {}).get("enabled"):
+            self.coordinator = RenderCoordinator(self.config_manager, get_task_queue(self.config_manager))
+        # Prefetched jobs are rendered by the workers too when distributed rendering is on
+        self.prefetcher = Prefetcher(self.config_manager, self.content_tracker, self.text_generator, self.coordinator)
+        self.history_file = os.path.join(self.config_manager.cache_dir, "job_history.jsonl")
+        self.workspaces = WorkspaceManager(self.config_manager)
+        self.workspaces.collect_garbage()
+        self.prefetcher.collect_garbage()
+    
+    def job_workspace(self, name):
+        """Return a context manager yielding a config that writes to a fresh workspace of its own"""
+        return self.workspaces.workspace(f"{name}-{os.getpid()}-{int(time.time() * 1000)}")
     
     async def generate_story(self):
         script = self.text_generator.generate_text(self.text_generator.get_story_prompt())
         script_data = self.file_utils.decode_json(script)
         if script_data and "title" in script_data:
-            await self.video_processor.generate_story_video(script)
+            with self.job_workspace("story") as job_config:
+                await VideoProcessor(job_config).generate_story_video(script)
             self.content_tracker.save_new_content('story', script_data["title"])
             
             output_file = os.path.join(self.config_manager.output_dir, "story.mp4")
@@ -773,39 +3551,221 @@ class ShortsGenerator:
                     script_data.get("description", "Short story video")
                 )
     
-    async def generate_short_video(self):
-        script = self.text_generator.generate_text(self.text_generator.get_short_video_prompt())
-        output_file, script_data = await self.video_processor.generate_short_video(script)
+    async def generate_short_video(self, video_processor=None):
+        if video_processor is None:
+            with self.job_workspace("short") as job_config:
+                return await self.generate_short_video(VideoProcessor(job_config))
+        
+        metrics = JobMetrics("short")
+        output_file, script_data = await self.prefetcher.render_next_job("short", video_processor.config.output_dir, metrics)
+        if not output_file:
+            with metrics.stage("script"):
+                script = await asyncio.to_thread(self.text_generator.generate_text, self.text_generator.get_short_video_prompt())
+            if self.coordinator:
+                script_data = self.file_utils.decode_json(script)
+                if script_data:
+                    output_file = await self.coordinator.render(script_data, "short", metrics=metrics, output_dir=video_processor.config.output_dir)
+            else:
+                output_file, script_data = await video_processor.generate_short_video(script, metrics)
         if output_file and script_data and "fact" in script_data:
-            self.youtube_uploader.upload_to_youtube(output_file, script_data["fact"], script_data["description"])
+            with metrics.stage("upload"):
+                self.youtube_uploader.upload_to_youtube(output_file, script_data["fact"], script_data["description"])
             self.content_tracker.save_new_content('fact', script_data["fact"])
+            metrics.save(self.history_file)
+            return output_file
+        return None
     
-    async def generate_long_video(self):
-        script = self.text_generator.generate_text(self.text_generator.get_long_video_prompt(), max_tokens=4096)
+    async def generate_multi_format_video(self):
+        """Publish one short script in every configured format from a shared asset set"""
+        video_types = self.config_manager.config.get("multi_format", {}).get("formats", ["short", "long"])
+        script = self.text_generator.generate_text(self.text_generator.get_short_video_prompt())
         script_data = self.file_utils.decode_json(script)
-        if script_data and "topic" in script_data:
-            await self.video_processor.generate_long_video(script)
-            self.content_tracker.save_new_content('topic', script_data["topic"])
-            
-            output_file = os.path.join(self.config_manager.output_dir, "longVideo.mp4")
-            if os.path.exists(output_file):
+        if not script_data or "fact" not in script_data:
+            return
+        
+        with self.job_workspace("multi-format") as job_config:
+            output_files = await VideoProcessor(job_config).generate_multi_format_video(script_data, video_types)
+        for video_type in video_types:
+            if output_files.get(video_type):
+                self.youtube_uploader.upload_to_youtube(output_files[video_type], script_data["fact"], script_data["description"])
+        if output_files:
+            self.content_tracker.save_new_content('fact', script_data["fact"])
+    
+    async def generate_variant_videos(self, video_type="short"):
+        """Publish one script in every voice and language listed under variants in config.json"""
+        variants = self.config_manager.config.get("variants", [])
+        key = "fact" if video_type == "short" else "topic"
+        if video_type == "short":
+            script = self.text_generator.generate_text(self.text_generator.get_short_video_prompt())
+        else:
+            script = self.text_generator.generate_text(self.text_generator.get_long_video_prompt(), max_tokens=4096)
+        script_data = self.file_utils.decode_json(script)
+        if not script_data or key not in script_data:
+            return
+        
+        translations = {}
+        def translate(source_script, language):
+            translations[language] = self.text_generator.translate_script(source_script, language)
+            return translations[language]
+        
+        with self.job_workspace("variants") as job_config:
+            output_files = await VideoProcessor(job_config).generate_variants(script_data, video_type, variants, translate)
+        for variant in [{"name": "default"}] + variants:
+            output_file = output_files.get(variant["name"])
+            if not output_file:
+                continue
+            variant_script = translations.get(variant.get("language")) or script_data
+            video_id = self.youtube_uploader.upload_to_youtube(
+                output_file,
+                variant_script.get(key, script_data[key]),
+                variant_script.get("description", script_data.get("description", ""))
+            )
+            # YouTube ignores subtitle streams in the upload, captions are added as a track of their own
+            srt_file = os.path.splitext(output_file)[0] + ".srt"
+            caption_language = variant.get("caption_language") or self.config_manager.config["youtube"].get("default_language", "en")
+            try:
+                self.youtube_uploader.upload_captions(video_id, srt_file, caption_language, variant["name"])
+            except Exception as e:
+                print(f"Error uploading captions for variant {variant['name']}: {e}")
+        if output_files:
+            self.content_tracker.save_new_content(key, script_data[key])
+    
+    async def stream_script(self, prompt, layout, video_processor, max_tokens=4096):
+        """Generate a script while preparing each part's TTS and clips as soon as it is streamed.
+        
+        Returns the full script text and a dict of prepared parts keyed by part index.
+        """
+        loop = asyncio.get_running_loop()
+        parser = StreamingScriptParser()
+        streamed_parts = []
+        pending = []
+        
+        def on_chunk(chunk):
+            # Called from the streaming thread, hand each finished part to the event loop
+            for part in parser.feed(chunk):
+                i = len(streamed_parts)
+                streamed_parts.append(part)
+                pending.append(asyncio.run_coroutine_threadsafe(video_processor.prepare_part(i, part, layout), loop))
+        
+        script = await asyncio.to_thread(self.text_generator.generate_text_stream, prompt, max_tokens=max_tokens, on_chunk=on_chunk)
+        results = await asyncio.gather(*[asyncio.wrap_future(future) for future in pending], return_exceptions=True)
+        
+        prepared_parts = {}
+        for i, result in enumerate(results):
+            if isinstance(result, Exception):
+                print(f"Error preparing streamed part {i}: {result}")
+                continue
+            prepared_parts[i] = result
+        
+        # Only keep assets whose part matches the final parsed script
+        script_data = self.file_utils.decode_json(script)
+        script_parts = script_data.get("script", []) if isinstance(script_data, dict) else []
+        for i in list(prepared_parts):
+            if i >= len(script_parts) or script_parts[i] != streamed_parts[i]:
+                prepared_part = prepared_parts.pop(i)
+                video_processor.file_utils.delete_temp_files([prepared_part["audio_file"]] + prepared_part["clip_files"])
+        
+        return script, prepared_parts
+    
+    async def generate_long_video(self, video_processor=None):
+        if video_processor is None:
+            with self.job_workspace("long") as job_config:
+                return await self.generate_long_video(VideoProcessor(job_config))
+        
+        metrics = JobMetrics("long")
+        output_file, script_data = await self.prefetcher.render_next_job("long", video_processor.config.output_dir, metrics)
+        if not output_file:
+            layout = video_processor.get_layout("long")
+            with metrics.stage("script"):
+                script, prepared_parts = await self.stream_script(self.text_generator.get_long_video_prompt(), layout, video_processor=video_processor)
+            script_data = self.file_utils.decode_json(script)
+            if not script_data or "topic" not in script_data:
+                for prepared_part in prepared_parts.values():
+                    video_processor.file_utils.delete_temp_files([prepared_part["audio_file"]] + prepared_part["clip_files"])
+                return None
+            if self.coordinator:
+                output_file = await self.coordinator.render(
+                    script_data, "long", prepared_parts, video_processor.config.temp_dir, metrics, video_processor.config.output_dir
+                )
+            else:
+                output_file = await video_processor.generate_long_video(script, prepared_parts, metrics)
+        
+        self.content_tracker.save_new_content('topic', script_data["topic"])
+        if output_file and os.path.exists(output_file):
+            with metrics.stage("upload"):
                 self.youtube_uploader.upload_to_youtube(
                     output_file, 
                     script_data["topic"], 
                     script_data.get("description", "Educational video about " + script_data["topic"])
                 )
+            metrics.save(self.history_file)
+            return output_file
+        return None
+    
+    async def run_job(self, video_type, job_id):
+        """Produce one video in directories of its own so jobs can run concurrently"""
+        with self.workspaces.workspace(job_id) as workspace_config:
+            job_config = self.config_manager.for_job(job_id, workspace_config.temp_dir)
+            job_config.quota_bytes = workspace_config.quota_bytes
+            try:
+                if video_type == "short":
+                    return await self.generate_short_video(VideoProcessor(job_config))
+                return await self.generate_long_video(VideoProcessor(job_config))
+            except Exception as e:
+                print(f"Error running job {job_id}: {e}")
+                return None
     
     async def run(self):
         # if self.content_tracker.use_story_prompt:
         #     await self.generate_story()
         # else:
         #     await self.generate_short_video()
-            
+        
         await self.generate_long_video()
 
 
 def main():
-    generator = ShortsGenerator()
+    parser = argparse.ArgumentParser(description="Generate and upload videos to YouTube")
+    parser.add_argument("--prefetch", type=int, metavar="COUNT", help="prepare COUNT jobs ahead of time instead of producing a video")
+    parser.add_argument("--draft", action="store_true", help="render a low-resolution draft of the next prefetched job")
+    parser.add_argument("--multi-format", action="store_true", help="render one short script in every format listed under multi_format in config.json")
+    parser.add_argument("--variants", action="store_true", help="render one script in every voice and language listed under variants in config.json")
+    parser.add_argument("--worker", action="store_true", help="render segment tasks from the distributed task queue")
+    parser.add_argument("--schedule", action="store_true", help="run the jobs in the scheduler jobs file ordered by deadline")
+    parser.add_argument("--autotune", action="store_true", help="benchmark encoder settings on this host and save per-role encoder profiles")
+    parser.add_argument("--profile", action="store_true", help="profile rendering and write reports to the profiling output directory")
+    parser.add_argument("--type", choices=["short", "long"], default="long", help="video type to prefetch, draft or render variants of (default: long)")
+    args = parser.parse_args()
+    
+    if args.autotune:
+        EncoderAutotuner(ConfigManager()).run()
+        return
+    
+    if args.worker:
+        config_manager = ConfigManager()
+        RenderWorker(config_manager, get_task_queue(config_manager)).run()
+        return
+    
+    if args.draft:
+        generator = ShortsGenerator(update_last_video_type=False, profile=args.profile)
+        asyncio.run(generator.prefetcher.render_draft(args.type))
+        return
+    
+    if args.prefetch:
+        generator = ShortsGenerator(update_last_video_type=False)
+        asyncio.run(generator.prefetcher.prefetch(args.type, args.prefetch))
+        return
+    
+    generator = ShortsGenerator(profile=args.profile)
+    if args.multi_format:
+        asyncio.run(generator.generate_multi_format_video())
+        return
+    if args.variants:
+        asyncio.run(generator.generate_variant_videos(args.type))
+        return
+    if args.schedule:
+        asyncio.run(JobScheduler(generator).run())
+        return
     asyncio.run(generator.run())
 
 if __name__ == "__main__":
@@ -65,6 +65,7 @@ def create_directories():
         "background",
         "temp",
         "output",
+        "cache",
         "chosen",
         "fonts"
     ]
@@ -127,16 +128,98 @@ def create_config_if_not_exists():
             "short_format": {"width": 1080, "height": 1920},
             "long_format": {"width": 1920, "height": 1080},
             "font": "./fonts/Lobster-Regular.ttf",
-            "font_size": 70
+            "font_size": 70,
+            "fps": 30
+        },
+        "audio": {
+            "sample_rate": 44100,
+            "target_loudness": -16.0,
+            "peak_limit": -1.0
+        },
+        "pexels": {
+            "requests_per_hour": 200,
+            "burst": 10,
+            "prefetch_reserve": 3
         },
         "paths": {
             "background_dir": "./background",
             "temp_dir": "./temp",
-            "output_dir": "./output"
+            "output_dir": "./output",
+            "cache_dir": "./cache"
+        },
+        "prefetch": {
+            "normalize_clips": True
+        },
+        "multi_format": {
+            "formats": ["short", "long"]
+        },
+        "variants": [],
+        "profiling": {
+            "enabled": False,
+            "output_dir": "./profiles",
+            "sample_interval": 0.005
+        },
+        "workspace": {
+            "use_tmpfs": True,
+            "tmpfs_dir": "/dev/shm/shortsgenerator",
+            "quota_mb": 4096
+        },
+        "concurrency": {
+            "max_downloads": 4,
+            "max_tts": 4,
+            "max_renders": 2,
+            "max_rss_mb": None,
+            "min_available_mb": 512,
+            "sample_interval": 1.0
+        },
+        "autotune": {
+            "seconds": 2,
+            "presets": ["ultrafast", "superfast", "veryfast", "faster", "fast", "medium"],
+            "crf": [18, 20, 23, 26],
+            "final_ssim_drop": 0.01,
+            "final_min_speed": 1.0,
+            "intermediate_ssim_drop": 0.003
+        },
+        "clip_index": {
+            "enabled": True,
+            "library_dir": "./cache/clips",
+            "keep_downloads": True,
+            "max_library_mb": 10240,
+            "synonyms": {
+                "ocean": ["sea"],
+                "car": ["automobile", "vehicle"],
+                "city": ["urban", "town"],
+                "forest": ["woods", "jungle"],
+                "people": ["person", "crowd"],
+                "space": ["galaxy", "universe", "cosmos"],
+                "computer": ["laptop"],
+                "money": ["cash", "currency"]
+            }
+        },
+        "scheduler": {
+            "jobs_file": "./schedule.json",
+            "max_parallel": 2,
+            "parallel_slowdown": 0.6
+        },
+        "distributed": {
+            "enabled": False,
+            "backend": "sqlite",
+            "sqlite_path": "./cache/tasks.db",
+            "redis_url": "redis://localhost:6379/0",
+            "shared_dir": "./shared",
+            "lease_seconds": 300,
+            "max_attempts": 3,
+            "poll_interval": 2
+        },
+        "draft": {
+            "scale": 0.33,
+            "fps_scale": 0.5,
+            "crf": 35
         },
         "youtube": {
             "default_tags": ["Shorts", "QuickClips", "FunFacts"],
             "default_privacy": "public",
+            "default_language": "en",
             "channel_id": ""
         }
     }
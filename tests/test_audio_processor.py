@@ -0,0 +1,43 @@
+import subprocess
+from types import SimpleNamespace
+
+import pytest
+
+from main import AudioProcessor, FileUtils
+
+
+def make_tone(path, duration):
+    subprocess.run(
+        [
+            FileUtils(None).ffmpeg_binary(), "-y", "-loglevel", "error",
+            "-f", "lavfi", "-i", f"sine=frequency=440:duration={duration}", str(path)
+        ],
+        check=True
+    )
+
+
+@pytest.fixture
+def audio_processor(tmp_path):
+    return AudioProcessor(SimpleNamespace(config={"audio": {"sample_rate": 44100}}, temp_dir=str(tmp_path)))
+
+
+def test_build_track_handles_sub_second_parts(tmp_path, audio_processor):
+    make_tone(tmp_path / "short.mp3", 0.5)
+    make_tone(tmp_path / "long.mp3", 1.5)
+    
+    track_file, offsets = audio_processor.build_track(["short.mp3", "long.mp3"], "track")
+    
+    assert (tmp_path / track_file).exists()
+    assert offsets[0][0] == 0
+    # mp3 encoding pads a few milliseconds of silence
+    assert offsets[0][1] == pytest.approx(0.5, abs=0.06)
+    assert offsets[1][0] == offsets[0][1]
+    assert offsets[1][1] - offsets[1][0] == pytest.approx(1.5, abs=0.06)
+
+
+def test_build_track_pads_parts_to_their_slots(tmp_path, audio_processor):
+    make_tone(tmp_path / "short.mp3", 0.5)
+    
+    _, offsets = audio_processor.build_track(["short.mp3", "short.mp3"], "track", slot_durations=[0.8, 0.9])
+    
+    assert offsets == [(0.0, 0.8), (0.8, pytest.approx(1.7))]
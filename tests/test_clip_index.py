@@ -0,0 +1,21 @@
+import pytest
+
+from main import ClipIndex
+
+
+@pytest.mark.parametrize("words", [
+    ("horse", "horses"),
+    ("house", "houses"),
+    ("smile", "smiling", "smiled", "smiles"),
+    ("rise", "rising", "rises"),
+    ("wave", "waves", "waving", "waved"),
+    ("dance", "dancing", "dances"),
+    ("create", "created", "creating"),
+    ("run", "running", "runs"),
+    ("city", "cities"),
+    ("box", "boxes"),
+    ("glass", "glasses"),
+    ("fall", "falling"),
+])
+def test_stem_reduces_word_forms_to_one_term(words):
+    assert len({ClipIndex.stem(word) for word in words}) == 1
@@ -0,0 +1,37 @@
+import threading
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from main import PexelsRateLimiter
+
+
+def response(remaining, days_to_reset=29, status_code=200):
+    return SimpleNamespace(status_code=status_code, headers={
+        "X-Ratelimit-Remaining": str(remaining),
+        "X-Ratelimit-Reset": str(time.time() + days_to_reset * 86400)
+    })
+
+
+def test_monthly_quota_keeps_configured_rate():
+    limiter = PexelsRateLimiter(requests_per_hour=200)
+    limiter.update(response(19990))
+    assert limiter.refill_rate * 3600 == pytest.approx(200)
+
+
+def test_low_monthly_quota_is_spread_until_reset():
+    limiter = PexelsRateLimiter(requests_per_hour=200)
+    limiter.update(response(100))
+    assert limiter.refill_rate * 3600 < 1
+    assert limiter.tokens <= 100
+
+
+def test_prefetch_reserve_larger_than_burst_does_not_block_forever():
+    limiter = PexelsRateLimiter(requests_per_hour=36000, burst=2, prefetch_reserve=3)
+    threads = [threading.Thread(target=limiter.acquire, args=(PexelsRateLimiter.PRIORITY_PREFETCH + i,), daemon=True) for i in range(3)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(10)
+    assert not any(thread.is_alive() for thread in threads)
@@ -0,0 +1,63 @@
+import time
+
+import pytest
+
+from main import SQLiteTaskQueue
+
+
+@pytest.fixture
+def queue(tmp_path):
+    return SQLiteTaskQueue(str(tmp_path / "tasks.db"), max_attempts=2)
+
+
+def expire_leases(queue):
+    time.sleep(0.05)
+    return queue.requeue_expired()
+
+
+def test_enqueue_and_claim_are_idempotent(queue):
+    assert queue.enqueue("job", "job-0", {"index": 0})
+    assert not queue.enqueue("job", "job-0", {"index": 1})
+    task = queue.claim("worker-a", 60)
+    assert task["task_id"] == "job-0"
+    assert task["payload"] == {"index": 0}
+    assert task["status"] == "claimed"
+    assert task["attempts"] == 1
+    assert queue.claim("worker-b", 60) is None
+
+
+def test_expired_lease_is_requeued(queue):
+    queue.enqueue("job", "job-0", {})
+    queue.claim("worker-a", 0.01)
+    assert expire_leases(queue) == 1
+    [task] = queue.job_tasks("job")
+    assert task["status"] == "pending"
+    assert task["error"] == "lease expired"
+    assert queue.claim("worker-b", 60)["worker_id"] == "worker-b"
+
+
+def test_stale_worker_cannot_complete(queue):
+    queue.enqueue("job", "job-0", {})
+    queue.claim("worker-a", 0.01)
+    expire_leases(queue)
+    queue.claim("worker-b", 60)
+    assert not queue.complete("job-0", "worker-a", {"segment": "stale.mp4"})
+    assert not queue.heartbeat("job-0", "worker-a", 60)
+    assert not queue.fail("job-0", "worker-a", "stale")
+    assert queue.complete("job-0", "worker-b", {"segment": "fresh.mp4"})
+    [task] = queue.job_tasks("job")
+    assert task["status"] == "done"
+    assert task["result"] == {"segment": "fresh.mp4"}
+
+
+def test_task_fails_after_max_attempts(queue):
+    queue.enqueue("job", "job-0", {})
+    queue.claim("worker-a", 60)
+    assert queue.fail("job-0", "worker-a", "encoder crashed")
+    assert queue.job_tasks("job")[0]["status"] == "pending"
+    queue.claim("worker-b", 0.01)
+    assert expire_leases(queue) == 1
+    [task] = queue.job_tasks("job")
+    assert task["status"] == "failed"
+    assert task["attempts"] == 2
+    assert queue.claim("worker-c", 60) is None